@@ -1,21 +1,55 @@
 import os
 import io
+import hmac
+import json
+import unicodedata
+from collections import namedtuple
 from datetime import datetime, date, timedelta
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import numpy as np
 import pandas as pd
 import sqlalchemy as sa
-import requests
+from openpyxl import load_workbook
+
+from werkzeug.datastructures import FileStorage
+
+import cola
+import estados
+import exportar
+from cache_http import condicional
+import metricas
+import subidas
+from fechas import a_fechas
+from ingesta import (
+    BloqueIlegible, cargar_dataframe, cargar_bloques, carga_previa, definir_cargas, hash_archivo, huellas,
+    registrar_carga,
+)
+from plantillas import formatear_fechas, formatear_montos, plantilla_para, resumen_para
+from telefonos import a_e164
 
 app = Flask(__name__)
 CORS(app)
+metricas.instrumentar_app(app)
 
 # ---------------------------
 # DB
 # ---------------------------
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///facturas.db")
 engine = sa.create_engine(DATABASE_URL, future=True)
+metricas.instrumentar_engine(engine)
+
+def _sin_acentos(texto):
+    """'Pérez Ñuñez' -> 'perez nunez' (lo mismo que unaccent(lower()) en Postgres)."""
+    if texto is None:
+        return None
+    return "".join(ch for ch in unicodedata.normalize("NFKD", str(texto).lower()) if not unicodedata.combining(ch))
+
+if engine.dialect.name == "sqlite":
+    @sa.event.listens_for(engine, "connect")
+    def _registrar_sin_acentos(dbapi_conn, _):
+        dbapi_conn.create_function("sin_acentos", 1, _sin_acentos, deterministic=True)
 metadata = sa.MetaData()
 
 facturas = sa.Table(
@@ -26,8 +60,25 @@ facturas = sa.Table(
     sa.Column("vence", sa.Date, nullable=False),
     sa.Column("estado", sa.String(32), nullable=False, default="pendiente"),
     sa.Column("telefono", sa.String(32), nullable=True),
+    sa.Column("numero", sa.String(64), nullable=True),
+    sa.Column("huella", sa.String(40), nullable=True),
+)
+
+# índices para /notificar (candidatos) y /facturas (paginación por vence, id)
+_con_telefono = sa.and_(facturas.c.telefono.isnot(None), facturas.c.telefono != "")
+sa.Index("ix_facturas_estado_vence", facturas.c.estado, facturas.c.vence)
+sa.Index("ix_facturas_vence_id", facturas.c.vence, facturas.c.id)
+sa.Index("ux_facturas_huella", facturas.c.huella, unique=True)
+sa.Index(
+    "ix_facturas_vence_con_telefono", facturas.c.vence,
+    postgresql_where=_con_telefono, sqlite_where=_con_telefono,
 )
 
+notificaciones = cola.definir_tabla(metadata)
+meta = estados.definir_meta(metadata)
+cargas = definir_cargas(metadata)
+tablas_subidas = subidas.definir_tablas(metadata)
+
 metadata.create_all(engine)
 
 # si la tabla ya existía sin 'telefono', la añadimos
@@ -36,29 +87,107 @@ try:
     cols = [c["name"] for c in insp.get_columns("facturas")]
     if "telefono" not in cols:
         with engine.begin() as conn:
-            conn.exec_driver_sql("ALTER TABLE facturas ADD COLUMN telefono 
-VARCHAR(32);")
+            conn.exec_driver_sql("ALTER TABLE facturas ADD COLUMN telefono VARCHAR(32);")
+    if "numero" not in cols:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE facturas ADD COLUMN numero VARCHAR(64);")
+    if "huella" not in cols:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE facturas ADD COLUMN huella VARCHAR(40);")
+            # huella para lo ya cargado; los duplicados existentes quedan sin huella
+            viejas = pd.DataFrame(conn.execute(sa.select(facturas.c.id, facturas.c.cliente, facturas.c.monto, facturas.c.vence)).all(),
+                                  columns=["id", "cliente", "monto", "vence"])
+            if not viejas.empty:
+                viejas["huella"] = huellas(viejas)
+                viejas.loc[viejas["huella"].duplicated(), "huella"] = None
+                conn.execute(
+                    facturas.update().where(facturas.c.id == sa.bindparam("b_id")),
+                    [{"b_id": int(i), "huella": h} for i, h in zip(viejas["id"], viejas["huella"])],
+                )
+                estados.tocar_version(conn, meta)
+    cols_notif = [c["name"] for c in insp.get_columns("notificaciones")]
+    if "facturas" not in cols_notif:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE notificaciones ADD COLUMN facturas TEXT;")
+            conn.exec_driver_sql("ALTER TABLE notificaciones ADD COLUMN n_facturas INTEGER NOT NULL DEFAULT 1;")
+    if "telefonos_invalidos" not in [c["name"] for c in insp.get_columns("subidas_bloques")]:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE subidas_bloques ADD COLUMN telefonos_invalidos INTEGER NOT NULL DEFAULT 0;")
 except Exception:
     pass
 
+# create_all no agrega índices nuevos a una tabla que ya existía
+for _idx in facturas.indexes:
+    _idx.create(engine, checkfirst=True)
+
+# en Postgres, ?q= busca sin acentos con un índice trigram sobre f_unaccent(lower(cliente))
+# (unaccent no es IMMUTABLE y no se puede indexar directo) y ordena por similarity()
+BUSQUEDA_PG = False
+if engine.dialect.name == "postgresql":
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS unaccent;")
+            conn.exec_driver_sql(
+                "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+                "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+                "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;"
+            )
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_facturas_cliente_unaccent_trgm "
+                "ON facturas USING gin (f_unaccent(lower(cliente)) gin_trgm_ops);"
+            )
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_facturas_cliente_trgm;")
+        BUSQUEDA_PG = True
+    except Exception:
+        pass
+
 REQUIRED_COLS = {"cliente", "monto", "vence"}
-OPTIONAL_COLS = {"telefono"}
+OPTIONAL_COLS = {"telefono", "numero"}
+# otros nombres con que llega el número de factura
+COL_ALIASES = {"factura": "numero", "no_factura": "numero", "num_factura": "numero", "nro_factura": "numero"}
+MAX_PAGE = 1000
+FilaCandidata = namedtuple("FilaCandidata", "id cliente monto vence telefono")
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 20000))
+# columnas de /facturas/export (la huella es interna)
+COLS_EXPORT = ["id", "numero", "cliente", "monto", "vence", "estado", "telefono"]
+TIPOS_EXPORT = {"id": "int", "monto": "float", "vence": "date"}
 
 # ---------------------------
 # Helpers
 # ---------------------------
-def _to_date(val):
-    if pd.isna(val):
-        return None
-    if isinstance(val, (datetime, date, pd.Timestamp)):
-        return pd.Timestamp(val).date()
-    s = str(val).strip()
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
-    return None
+def _columnas_normalizadas(columns):
+    columns = [str(c).strip().lower() for c in columns]
+    if "numero" not in columns:
+        columns = [COL_ALIASES.get(c, c) for c in columns]
+    missing = REQUIRED_COLS - set(columns)
+    if missing:
+        raise ValueError(f"Faltan columnas requeridas: {', '.join(sorted(missing))}")
+    return columns
+
+def _normalizar(df):
+    df.columns = _columnas_normalizadas(df.columns)
+
+    cols = list(REQUIRED_COLS | (OPTIONAL_COLS & set(df.columns)))
+    df = df[cols].copy()
+
+    df["cliente"] = df["cliente"].astype(str).str.strip()
+    df["monto"] = pd.to_numeric(df["monto"], errors="coerce")
+    df["vence"] = a_fechas(df["vence"])
+
+    if "telefono" in df.columns:
+        # E.164; los inválidos quedan sin teléfono (no se les envía) y se informan
+        df["telefono"], telefonos_invalidos = a_e164(df["telefono"])
+
+    if "numero" in df.columns:
+        numero = df["numero"].astype(str).str.strip().str.removesuffix(".0")
+        df["numero"] = numero.where(df["numero"].notna() & ~numero.isin(["", "nan", "None"]), None)
+
+    df = df.dropna(subset=["cliente", "monto", "vence"])
+    if "telefono" in df.columns:
+        malos = telefonos_invalidos[telefonos_invalidos].index
+        df.attrs["telefonos_invalidos"] = malos.intersection(df.index).tolist()
+    return df
 
 def _read_any_table(file_storage):
     name = (file_storage.filename or "").lower()
@@ -71,146 +200,426 @@ def _read_any_table(file_storage):
     else:
         raise ValueError("Formato no soportado. Use .csv, .xlsx o .xls")
 
-    df.columns = [str(c).strip().lower() for c in df.columns]
+    return _normalizar(df)
 
-    missing = REQUIRED_COLS - set(df.columns)
-    if missing:
-        raise ValueError(f"Faltan columnas requeridas: {', 
-'.join(sorted(missing))}")
+def _xlsx_por_bloques(stream, chunk_size):
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = _columnas_normalizadas(next(rows, None) or [])
+        bloque, inicio = [], 0
+        for row in rows:
+            bloque.append(row)
+            if len(bloque) >= chunk_size:
+                yield pd.DataFrame(bloque, columns=header, index=range(inicio, inicio + len(bloque)))
+                inicio += len(bloque)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=header, index=range(inicio, inicio + len(bloque)))
+    finally:
+        wb.close()
+
+def _csv_por_bloques(stream, chunk_size):
+    """
+    Corta el CSV en bloques de 'chunk_size' registros y parsea cada uno por
+    separado: una línea mal formada deja un BloqueIlegible en su bloque y el
+    resto del archivo se sigue cargando. Un registro termina en un salto de
+    línea fuera de comillas, así los campos con saltos de línea no se parten.
+    """
+    encabezado = stream.readline()
+    # valida encabezados antes de empezar a escribir
+    _columnas_normalizadas(pd.read_csv(io.BytesIO(encabezado), nrows=0).columns)
+    inicio = 0
+    while True:
+        lineas, registros, comillas, en_registro = [], 0, 0, False
+        while registros < chunk_size:
+            linea = stream.readline()
+            if not linea:
+                break
+            lineas.append(linea)
+            comillas += linea.count(b'"')
+            en_registro = en_registro or bool(linea.strip())
+            if comillas % 2 == 0 and en_registro:
+                registros += 1
+                en_registro = False
+        if en_registro:
+            registros += 1  # último registro con comillas sin cerrar
+        if not lineas:
+            return
+        try:
+            df = pd.read_csv(io.BytesIO(encabezado + b"".join(lineas)))
+        except Exception as e:
+            yield BloqueIlegible(f"Registros {inicio + 1}-{inicio + registros}: {e}", registros)
+        else:
+            df.index = range(inicio, inicio + len(df))
+            yield df
+        inicio += registros
+
+def _leer_por_bloques(file_storage, chunk_size=CHUNK_SIZE):
+    """
+    Lee el archivo en bloques de 'chunk_size' filas sin cargarlo entero en memoria.
+    La normalización se hace por bloque en cargar_bloques().
+    """
+    name = (file_storage.filename or "").lower()
+    stream = file_storage.stream
 
-    cols = list(REQUIRED_COLS | (OPTIONAL_COLS & set(df.columns)))
-    df = df[cols].copy()
+    if name.endswith(".csv"):
+        stream.seek(0)
+        bloques = _csv_por_bloques(stream, chunk_size)
+    elif name.endswith(".xlsx"):
+        bloques = _xlsx_por_bloques(stream, chunk_size)
+    elif name.endswith(".xls"):
+        # el formato binario antiguo no admite lectura por filas
+        df = pd.read_excel(stream)
+        _columnas_normalizadas(df.columns)
+        bloques = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    else:
+        raise ValueError("Formato no soportado. Use .csv, .xlsx o .xls")
 
-    df["cliente"] = df["cliente"].astype(str).str.strip()
-    df["monto"] = pd.to_numeric(df["monto"], errors="coerce")
-    df["vence"] = df["vence"].apply(_to_date)
+    yield from bloques
 
-    if "telefono" in df.columns:
-        df["telefono"] = (
-            df["telefono"].astype(str).str.replace(" ", "").str.replace("-", 
-"").str.strip()
+def _mensajes_por_lote(rows, modo: str, size: int = 2000):
+    """Genera (fila, mensaje) renderizando la plantilla por lotes de columnas."""
+    plantilla = plantilla_para(modo)
+    for lote in rows.partitions(size):
+        mensajes = plantilla.render_lote(
+            [r.cliente for r in lote], [r.monto for r in lote], [r.vence for r in lote]
         )
-        df.loc[df["telefono"].isin(["", "nan", "None"]), "telefono"] = None
-
-    df = df.dropna(subset=["cliente", "monto", "vence"])
-    return df
-
-def _estado_por_fecha(fecha_vence: date) -> str:
-    hoy = datetime.utcnow().date()
-    return "vencida" if fecha_vence < hoy else "pendiente"
-
-def _compose_message(cliente: str, monto: float, vence: date) -> str:
-    tpl = os.getenv(
-        "WASENDER_MSG_TEMPLATE",
-        "Estimado {cliente}, le recordamos su factura por ₡{monto} que vence el 
-{vence}. – {firma}",
-    )
-    firma = os.getenv("PLANTILLA_FIRMA", "Noa Cobros")
-    return tpl.format(
-        cliente=cliente,
-        monto=f"{monto:,.0f}".replace(",", "."),
-        vence=pd.Timestamp(vence).date().strftime("%d/%m/%Y"),
-        firma=firma,
-    )
-
-def _send_whatsapp(phone: str, message: str):
-    url = os.getenv("WASENDER_URL", "https://api.wasenderapi.com/send-message")
-    api_key = os.getenv("WASENDER_API_KEY", "")
-    if not api_key:
-        return {"ok": False, "error": "Falta WASENDER_API_KEY"}
-
-    try:
-        r = requests.post(url, json={"api_key": api_key, "phone": phone, 
-"message": message}, timeout=15)
-        return {"ok": 200 <= r.status_code < 300, "status": r.status_code, 
-"resp": (r.text[:300] if r.text else "")}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
+        yield from zip(lote, mensajes)
+
+def _claves_telefono(filas) -> list:
+    # lo cargado ya viene en E.164; esto cubre filas guardadas antes de normalizar
+    telefonos = pd.Series([f.telefono for f in filas], dtype=object)
+    normalizados, _ = a_e164(telefonos)
+    return normalizados.where(normalizados.notna(), telefonos.astype(str)).tolist()
+
+def _mensajes_por_telefono(rows, modo: str, detalle: bool = True):
+    """
+    Agrupa los candidatos por teléfono y genera (filas, telefono, mensaje): un
+    resumen cuando el teléfono tiene varias facturas, el mensaje de siempre si
+    tiene una sola. Solo guarda columnas livianas de cada fila; teléfonos,
+    montos, fechas y totales se normalizan/formatean en lote, una vez para todos.
+    """
+    filas = [FilaCandidata(r.id, r.cliente, r.monto, r.vence, r.telefono) for r in rows]
+    if not filas:
+        return
+    # grupos en orden de primera aparición; dentro de cada uno, el orden de la consulta (vence, id)
+    codigos, _ = pd.factorize(pd.Series(_claves_telefono(filas), dtype=object))
+    orden = np.argsort(codigos, kind="stable")
+    indices = np.split(orden, np.flatnonzero(np.diff(codigos[orden])) + 1)
+
+    importes = np.array([f.monto for f in filas], dtype=float)
+    montos = formatear_montos(importes)
+    vences = formatear_fechas([f.vence for f in filas])
+    totales = formatear_montos(np.bincount(codigos, weights=importes))
+
+    plantilla, resumen = plantilla_para(modo), resumen_para(modo)
+    for g, total in zip(indices, totales):
+        grupo = [filas[i] for i in g]
+        if len(g) == 1:
+            yield grupo, grupo[0].telefono, plantilla.render_formateado(grupo[0].cliente, montos[g[0]], vences[g[0]])
+        else:
+            yield grupo, grupo[0].telefono, resumen.render_resumen(
+                grupo[0].cliente, montos[g], vences[g], total, detalle
+            )
 
 # ---------------------------
 # Rutas
 # ---------------------------
+def _fila_json(r):
+    r = dict(r._mapping)
+    if isinstance(r["vence"], (datetime, date)):
+        r["vence"] = r["vence"].isoformat()
+    return r
+
+def _cursor(r):
+    return f"{r['vence']},{r['id']}"
+
+def _parse_cursor(after):
+    vence, fid = after.rsplit(",", 1)
+    return date.fromisoformat(vence), int(fid)
+
+def _version_facturas():
+    with engine.connect() as conn:
+        return estados.version_facturas(conn, meta)
+
+def _tocar_si_cambio(conn, info):
+    # una re-carga sin cambios no invalida los ETag ni la caché
+    if "error" not in info and (info.get("insertados") or info.get("actualizados")):
+        estados.tocar_version(conn, meta)
+
+def _busqueda_cliente(texto):
+    """(condición, rank) para ?q=: sin acentos ni mayúsculas; rank solo en Postgres (si no, None)."""
+    c = facturas.c
+    patron = "%" + _sin_acentos(texto).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if BUSQUEDA_PG:
+        col = sa.func.f_unaccent(sa.func.lower(c.cliente))
+        return col.like(patron, escape="\\"), sa.func.similarity(col, _sin_acentos(texto))
+    if engine.dialect.name == "sqlite":
+        return sa.func.sin_acentos(c.cliente).like(patron, escape="\\"), None
+    return c.cliente.icontains(texto, autoescape=True), None
+
+def _filtrar_facturas(q):
+    """
+    ?q=, ?orden=relevancia y ?after= de /facturas. Devuelve (consulta, offset):
+    por defecto ordena por (vence, id) y 'after' es ese keyset; con
+    orden=relevancia (Postgres) ordena por similarity() y 'after' es la
+    cantidad de filas ya leídas. ValueError si 'after' es inválido.
+    """
+    c = facturas.c
+    rank = None
+    texto = (request.args.get("q") or "").strip()
+    if texto:
+        condicion, rank = _busqueda_cliente(texto)
+        q = q.where(condicion)
+    if request.args.get("orden") != "relevancia":
+        rank = None
+    if rank is not None:
+        q = q.order_by(rank.desc(), c.vence.asc(), c.id.asc())
+    else:
+        q = q.order_by(c.vence.asc(), c.id.asc())
+
+    after = request.args.get("after")
+    if rank is not None:
+        offset = max(0, int(after)) if after else 0
+        return q.offset(offset), offset
+    if after:
+        vence, fid = _parse_cursor(after)
+        q = q.where(sa.or_(c.vence > vence, sa.and_(c.vence == vence, c.id > fid)))
+    return q, None
+
 @app.get("/facturas")
+@condicional(_version_facturas)
 def listar_facturas():
+    """
+    ?limit=N&after=<vence>,<id>  -> página ordenada por (vence, id)
+    ?format=ndjson               -> una factura por línea, sin armar la lista completa
+    ?q=texto                     -> filtra por cliente sin distinguir acentos ni mayúsculas
+                                    (índice pg_trgm en Postgres)
+    ?orden=relevancia            -> con ?q= en Postgres, por similarity(); ahí 'after'
+                                    y 'next' son un offset
+    Sin parámetros devuelve todo, como antes.
+    """
+    try:
+        q, offset = _filtrar_facturas(sa.select(facturas))
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Parámetros 'limit'/'after' inválidos"}), 400
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE))
+        q = q.limit(limit)
+
+    if request.args.get("format") == "ndjson":
+        def generar():
+            with engine.connect() as conn:
+                for r in conn.execution_options(stream_results=True, yield_per=2000).execute(q):
+                    yield json.dumps(_fila_json(r), ensure_ascii=False) + "\n"
+        return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
+
     with engine.begin() as conn:
-        rows = [dict(r._mapping) for r in 
-conn.execute(sa.select(facturas).order_by(facturas.c.vence.asc(), 
-facturas.c.id.asc()))]
-        for r in rows:
-            if isinstance(r["vence"], (datetime, date)):
-                r["vence"] = pd.Timestamp(r["vence"]).date().isoformat()
-    return jsonify({"ok": True, "data": rows})
+        rows = [_fila_json(r) for r in conn.execute(q)]
+    nxt = None
+    if limit is not None and len(rows) == limit:
+        nxt = str(offset + limit) if offset is not None else _cursor(rows[-1])
+    return jsonify({"ok": True, "data": rows, "next": nxt})
+
+@app.get("/facturas/export")
+def exportar_facturas():
+    """
+    ?format=csv|xlsx|parquet con los mismos filtros que /facturas (?q=, ?after=).
+    Lee del cursor por bloques de exportar.BLOQUE filas; CSV y Parquet empiezan
+    a salir con el primer bloque.
+    """
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in exportar.FORMATOS:
+        return jsonify({"ok": False, "error": f"Formato no soportado: {fmt} (csv, xlsx, parquet)"}), 400
+    if fmt == "parquet" and not exportar.parquet_disponible():
+        return jsonify({"ok": False, "error": "Exportar a Parquet requiere pyarrow (pip install pyarrow)"}), 501
+    try:
+        q, _ = _filtrar_facturas(sa.select(*[facturas.c[k] for k in COLS_EXPORT]))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Parámetro 'after' inválido"}), 400
+
+    def bloques():
+        with engine.connect() as conn:
+            res = conn.execution_options(stream_results=True, yield_per=exportar.BLOQUE).execute(q)
+            yield from res.partitions()
+
+    if fmt == "csv":
+        cuerpo = exportar.csv_stream(COLS_EXPORT, bloques())
+    elif fmt == "xlsx":
+        cuerpo = exportar.xlsx_stream(COLS_EXPORT, bloques())
+    else:
+        cuerpo = exportar.parquet_stream(COLS_EXPORT, TIPOS_EXPORT, bloques())
+
+    mimetype, ext = exportar.FORMATOS[fmt]
+    nombre = f"facturas-{date.today():%Y%m%d}.{ext}"
+    return Response(stream_with_context(cuerpo), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{nombre}"'})
 
 @app.post("/upload-file")
 def upload_file():
+    """
+    Carga o re-carga un reporte: un archivo idéntico a uno ya cargado se salta
+    (salvo ?forzar=1) y cada fila se inserta, actualiza o deja igual según su huella.
+    Con ?async=1 responde 202 con un job_id y carga en segundo plano (GET /uploads/<job_id>).
+    """
     if "file" not in request.files:
-        return jsonify({"ok": False, "error": "Adjunte el archivo en el campo 
-'file'."}), 400
-    try:
-        df = _read_any_table(request.files["file"])
-        rows = df.to_dict(orient="records")
-
+        return jsonify({"ok": False, "error": "Adjunte el archivo en el campo 'file'."}), 400
+    file_storage = request.files["file"]
+    digest = hash_archivo(file_storage.stream)
+    if request.args.get("forzar") != "1":
         with engine.begin() as conn:
-            for r in rows:
-                conn.execute(
-                    facturas.insert().values(
-                        cliente=r["cliente"],
-                        monto=float(r["monto"]),
-                        vence=r["vence"],
-                        estado=_estado_por_fecha(r["vence"]),
-                        telefono=r.get("telefono"),
-                    )
-                )
+            previa = carga_previa(conn, cargas, digest)
+        if previa is not None:
+            return jsonify({"ok": True, "duplicado": True, "hash": digest, "cargado": previa.creado.isoformat(),
+                            "insertados": 0, "actualizados": 0, "sin_cambios": previa.filas})
+
+    if request.args.get("async") == "1":
+        return _upload_async(file_storage, digest)
+    if request.args.get("stream") == "1":
+        return _upload_por_bloques(file_storage, digest)
+    try:
+        df = _read_any_table(file_storage)
+        carga = cargar_dataframe(engine, facturas, df, registrar=_tocar_si_cambio)
 
         with engine.begin() as conn:
-            total = 
-conn.execute(sa.select(sa.func.count(facturas.c.id))).scalar_one()
+            registrar_carga(conn, cargas, digest, file_storage.filename, len(df))
+            total = conn.execute(sa.select(sa.func.count(facturas.c.id))).scalar_one()
 
-        return jsonify({"ok": True, "insertados": len(rows), "total": 
-int(total)})
+        malos = df.attrs.get("telefonos_invalidos", [])
+        return jsonify({"ok": True, **carga, "hash": digest, "total": int(total), "telefonos_invalidos": len(malos),
+                        "lineas_telefono_invalido": [int(i) + 2 for i in malos[:20]]})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
+def _upload_por_bloques(file_storage, digest):
+    # cada bloque se valida y escribe por separado: un bloque malo no anula el resto
+    try:
+        carga = cargar_bloques(engine, facturas, _leer_por_bloques(file_storage), _normalizar,
+                               registrar=_tocar_si_cambio)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    with engine.begin() as conn:
+        if not carga["errores"]:
+            registrar_carga(conn, cargas, digest, file_storage.filename, carga["filas"])
+        total = conn.execute(sa.select(sa.func.count(facturas.c.id))).scalar_one()
+
+    return jsonify({"ok": not carga["errores"], **carga, "hash": digest, "total": int(total)})
+
+def _cargar_subida(job, hechos, registrar):
+    def registrar_bloque(conn, info):
+        registrar(conn, info)
+        _tocar_si_cambio(conn, info)
+
+    with open(job.ruta, "rb") as f:
+        archivo = FileStorage(stream=f, filename=job.nombre)
+        res = cargar_bloques(engine, facturas, _leer_por_bloques(archivo), _normalizar,
+                             hechos=hechos, registrar=registrar_bloque)
+    if not res["errores"]:
+        with engine.begin() as conn:
+            registrar_carga(conn, cargas, job.hash, job.nombre, res["filas"])
+    return res
+
+def _upload_async(file_storage, digest):
+    nombre = file_storage.filename or ""
+    if not nombre.lower().endswith((".csv", ".xlsx", ".xls")):
+        return jsonify({"ok": False, "error": "Formato no soportado. Use .csv, .xlsx o .xls"}), 400
+    job_id, ruta = subidas.guardar(file_storage)
+    with engine.begin() as conn:
+        subidas.crear(conn, tablas_subidas, job_id, nombre, digest, ruta)
+    subidas.lanzar(engine, tablas_subidas, job_id, _cargar_subida)
+    return jsonify({"ok": True, "job_id": job_id, "hash": digest}), 202
+
+@app.get("/uploads/<job_id>")
+def upload_progreso(job_id):
+    info = subidas.progreso(engine, tablas_subidas, job_id)
+    if info is None:
+        return jsonify({"ok": False, "error": "No existe el job"}), 404
+    return jsonify({"ok": True, **info})
+
+@app.post("/uploads/<job_id>/reanudar")
+def upload_reanudar(job_id):
+    """Reprocesa solo los bloques que fallaron (o que no llegaron a correr)."""
+    job = subidas.obtener(engine, tablas_subidas, job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "No existe el job"}), 404
+    if not subidas.reanudable(job):
+        return jsonify({"ok": False, "error": f"El job está '{job.estado}'"}), 409
+    if not os.path.exists(job.ruta):
+        return jsonify({"ok": False, "error": "El archivo del job ya no está en disco"}), 410
+    subidas.lanzar(engine, tablas_subidas, job_id, _cargar_subida)
+    return jsonify({"ok": True, "job_id": job_id}), 202
+
+def _candidatos_query(modo: str, dias: int):
+    hoy = datetime.utcnow().date()
+    hasta = hoy + timedelta(days=dias)
+
+    q = sa.select(facturas).where(_con_telefono)
+    if modo == "vencidas":
+        q = q.where(facturas.c.estado == "vencida")
+    elif modo != "todas":  # proximas
+        q = q.where(facturas.c.vence.between(hoy, hasta))
+    return q.order_by(facturas.c.vence, facturas.c.id)
+
 @app.post("/notificar")
 def notificar():
+    """
+    Encola los recordatorios (los envía worker.py). Por defecto manda un solo
+    mensaje por teléfono con el resumen de sus facturas; ?agrupar=0 vuelve a
+    uno por factura y ?detalle=0 omite la lista de facturas del resumen.
+    """
     modo = (request.args.get("modo") or "proximas").lower()
     dias = int(request.args.get("dias") or 3)
     dry_run = request.args.get("dry_run") == "1"
+    agrupar = request.args.get("agrupar") != "0"
 
-    hoy = datetime.utcnow().date()
-    hasta = hoy + timedelta(days=dias)
+    q = _candidatos_query(modo, dias)
 
+    # cursor del lado del servidor: las filas llegan por tandas, no todas a la vez
     with engine.begin() as conn:
-        data = [dict(r._mapping) for r in conn.execute(sa.select(facturas))]
-
-    for r in data:
-        if isinstance(r["vence"], str):
-            r["vence"] = _to_date(r["vence"])
-
-    if modo == "vencidas":
-        candidatos = [r for r in data if r["estado"] == "vencida"]
-    elif modo == "todas":
-        candidatos = data
-    else:  # proximas
-        candidatos = [r for r in data if r["vence"] and hoy <= r["vence"] <= 
-hasta]
-
-    candidatos = [r for r in candidatos if r.get("telefono")]
-
-    resultados = []
-    for r in candidatos:
-        msg = _compose_message(r["cliente"], float(r["monto"]), r["vence"])
-        if dry_run:
-            resultados.append({"id": r["id"], "cliente": r["cliente"], 
-"telefono": r["telefono"], "message": msg, "sent": False, "dry_run": True})
+        rows = conn.execution_options(stream_results=True, yield_per=2000).execute(q)
+        if agrupar:
+            candidatos = _mensajes_por_telefono(rows, modo, request.args.get("detalle") != "0")
         else:
-            resp = _send_whatsapp(r["telefono"], msg)
-            resultados.append({"id": r["id"], "cliente": r["cliente"], 
-"telefono": r["telefono"], "sent": bool(resp.get("ok")), "resp": resp})
-
-    return jsonify({"ok": True, "total_candidatos": len(candidatos), 
-"enviados_ok": sum(1 for r in resultados if r.get("sent")), "resultados": 
-resultados[:100]})
+            candidatos = (([r], r.telefono, msg) for r, msg in _mensajes_por_lote(rows, modo))
+
+        if not dry_run:
+            # el envío real lo hace worker.py; aquí solo queda registrado
+            job = cola.encolar(conn, notificaciones, (
+                {"factura_id": filas[0].id, "facturas": ",".join(str(f.id) for f in filas),
+                 "n_facturas": len(filas), "cliente": filas[0].cliente, "telefono": tel, "mensaje": msg}
+                for filas, tel, msg in candidatos
+            ))
+            if job["job_id"] is None:
+                return jsonify({"ok": True, "total_candidatos": 0, "mensajes": 0, "encolados": 0, "facturas": 0})
+            return jsonify({"ok": True, "total_candidatos": job["facturas"], "mensajes": job["encolados"], **job}), 202
+
+        total, mensajes, resultados = 0, 0, []
+        for filas, tel, msg in candidatos:
+            total += len(filas)
+            mensajes += 1
+            if len(resultados) < 100:
+                resultados.append({"id": filas[0].id, "facturas": [f.id for f in filas], "cliente": filas[0].cliente,
+                                   "telefono": tel, "message": msg, "sent": False, "dry_run": True})
+
+    return jsonify({"ok": True, "total_candidatos": total, "mensajes": mensajes, "enviados_ok": 0, "resultados": resultados})
+
+@app.get("/notificar/<job_id>")
+def notificar_progreso(job_id):
+    info = cola.progreso(engine, notificaciones, job_id)
+    if info is None:
+        return jsonify({"ok": False, "error": "No existe el job"}), 404
+    return jsonify({"ok": True, **info})
+
+@app.post("/estados/actualizar")
+def actualizar_estados():
+    """Pasa a 'vencida' lo que venció desde la última corrida. Requiere X-Admin-Token."""
+    token = os.getenv("ADMIN_TOKEN", "")
+    if not token or not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        return jsonify({"ok": False, "error": "No autorizado"}), 403
+    return jsonify({"ok": True, **estados.actualizar_vencidas(engine, facturas, meta)})
 
 # Debug: listar rutas cargadas (para verificar que Render tomó este archivo)
 @app.get("/debug-routes")
@@ -0,0 +1,226 @@
+"""
+Antigüedad de saldos (aging) y flujo esperado sobre una foto en columnas.
+
+La foto guarda 'facturas' como arrays de NumPy (id, cliente, monto, vence,
+abierta) y se pone al día leyendo solo las marcas de 'facturas_cambios'
+posteriores a su cursor (el seq), igual que /facturas/changes. Los
+cálculos son vectorizados (np.digitize + np.bincount); el resultado queda
+guardado por versión de datos y día.
+
+Cada proceso (worker de gunicorn) tiene su propia foto.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+
+import db
+
+# tramos por días de atraso: al día (<= 0), 1-30, 31-60, 61-90, más de 90
+TRAMOS = ["al_dia", "1_30", "31_60", "61_90", "90_mas"]
+BORDES = np.array([1, 31, 61, 91])
+
+_COLS = "id, cliente, monto, vence, estado <> 'pagada' AS abierta"
+
+
+class Foto:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.cursor = None
+        self.recargas = self.incrementales = 0
+        self._vaciar()
+
+    def _vaciar(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.cliente = np.empty(0, dtype=np.int32)
+        self.monto = np.empty(0, dtype=np.float64)
+        self.vence = np.empty(0, dtype="datetime64[D]")
+        self.abierta = np.empty(0, dtype=bool)
+        self.clientes = []
+        self._codigos = {}
+        self._aging = None
+
+    def _columnas(self, filas):
+        """(ids, cliente, monto, vence, abierta) en arrays, con el cliente como código."""
+        if not filas:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64),
+                    np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=bool))
+        ids, clientes, montos, vences, abiertas = zip(*filas)
+        codigos = np.empty(len(clientes), dtype=np.int32)
+        for i, c in enumerate(clientes):
+            k = self._codigos.get(c)
+            if k is None:
+                k = self._codigos[c] = len(self.clientes)
+                self.clientes.append(c)
+            codigos[i] = k
+        return (np.array(ids, dtype=np.int64), codigos, np.array(montos, dtype=np.float64),
+                np.array(vences, dtype="datetime64[D]"), np.array(abiertas, dtype=bool))
+
+    def _recargar(self, conn):
+        self._vaciar()
+        filas = conn.execute(f"SELECT {_COLS} FROM facturas ORDER BY id").fetchall()
+        self.ids, self.cliente, self.monto, self.vence, self.abierta = self._columnas(filas)
+        self.cursor = db.ultimo_cambio(conn)
+        self.recargas += 1
+
+    def _aplicar_cambios(self, conn) -> bool:
+        """Aplica lo cambiado desde el cursor; False si el cursor ya no alcanza (hay que recargar)."""
+        if db.cursor_vencido(conn, self.cursor):
+            return False
+        marcas = db.cambios_desde(conn, self.cursor)
+        if not marcas:
+            return True
+
+        tocados = np.array([m["id"] for m in marcas], dtype=np.int64)
+        nuevos = [m["id"] for m in marcas if m["tipo"] == "u"]
+        filas = []
+        for i in range(0, len(nuevos), 500):
+            lote = nuevos[i:i + 500]
+            filas += conn.execute(
+                f"SELECT {_COLS} FROM facturas WHERE id IN ({','.join('?' * len(lote))})", lote
+            ).fetchall()
+
+        # se quitan todos los ids tocados y se vuelven a agregar los que siguen existiendo
+        quedan = ~np.isin(self.ids, tocados)
+        cols = self._columnas(filas)
+        actuales = (self.ids, self.cliente, self.monto, self.vence, self.abierta)
+        unidas = [np.concatenate([a[quedan], b]) for a, b in zip(actuales, cols)]
+        orden = np.argsort(unidas[0], kind="stable")
+        self.ids, self.cliente, self.monto, self.vence, self.abierta = (a[orden] for a in unidas)
+        self.cursor = marcas[-1]["seq"]
+        self.incrementales += 1
+        return True
+
+    def refrescar(self):
+        """Pone la foto al día si la versión de datos cambió."""
+        with self._lock:
+            conn = db.get_conn()
+            # versión, cursor y filas en una misma transacción de lectura
+            conn.execute("BEGIN")
+            try:
+                version = conn.execute("SELECT version FROM version_datos WHERE id = 1").fetchone()[0]
+                if version != self.version:
+                    if self.cursor is None or not self._aplicar_cambios(conn):
+                        self._recargar(conn)
+                    self.version = version
+                    self._aging = None
+            finally:
+                conn.rollback()
+            return self.version
+
+    def aging(self, hoy: date):
+        """
+        Montos y cantidades por tramo (cartera y por cliente) y flujo esperado
+        por semana, de las facturas abiertas. Se calcula una vez por versión y día.
+        """
+        with self._lock:
+            clave = (self.version, hoy)
+            if self._aging is not None and self._aging[0] == clave:
+                return self._aging[1]
+
+            hoy64 = np.datetime64(hoy, "D")
+            abierta = self.abierta
+            monto, vence, cliente = self.monto[abierta], self.vence[abierta], self.cliente[abierta]
+            dias = (hoy64 - vence).astype(np.int64)
+            tramo = np.digitize(dias, BORDES)
+
+            n = len(TRAMOS)
+            cartera_monto = np.bincount(tramo, weights=monto, minlength=n)
+            cartera_n = np.bincount(tramo, minlength=n)
+            por_cliente = np.bincount(cliente * n + tramo, weights=monto,
+                                      minlength=len(self.clientes) * n).reshape(-1, n)
+            abiertas_cliente = np.bincount(cliente, minlength=len(self.clientes))
+            mas_antigua = np.full(len(self.clientes), np.datetime64("NaT"), dtype="datetime64[D]")
+            if len(vence):
+                # vence más antigua por cliente: ordenar por vence y quedarse con la primera de cada uno
+                o = np.argsort(vence, kind="stable")
+                primeros, idx = np.unique(cliente[o], return_index=True)
+                mas_antigua[primeros] = vence[o][idx]
+
+            # semana (lunes) de vencimiento contada desde la semana en curso
+            lunes = hoy64 - np.int64(hoy.weekday())
+            semana = (vence - lunes).astype(np.int64) // 7
+
+            # clientes con facturas abiertas, de mayor saldo a menor (empate por nombre)
+            saldo_cliente = por_cliente.sum(axis=1)
+            con_saldo = np.flatnonzero(abiertas_cliente)
+            nombres = np.array(self.clientes, dtype=str)[con_saldo]
+            ranking = con_saldo[np.lexsort((nombres, -saldo_cliente[con_saldo]))]
+
+            res = {
+                "clientes": self.clientes,
+                "codigos": self._codigos,
+                "ranking": ranking,
+                "cartera_monto": cartera_monto,
+                "cartera_n": cartera_n,
+                "por_cliente": por_cliente,
+                "abiertas_cliente": abiertas_cliente,
+                "mas_antigua": mas_antigua,
+                "saldo_cliente": saldo_cliente,
+                "lunes": lunes,
+                "semana": semana,
+                "monto_abierto": monto,
+                "vencido": dias > 0,
+            }
+            self._aging = (clave, res)
+            return res
+
+
+foto = Foto()
+
+
+def _r(x):
+    return round(float(x), 2)
+
+
+def aging(hoy: date = None, cliente: str = None, limit: int = 100, semanas: int = 12) -> dict:
+    """Antigüedad de saldos de la cartera, por cliente (los 'limit' de mayor saldo) y flujo semanal."""
+    hoy = hoy or date.today()
+    version = foto.refrescar()
+    a = foto.aging(hoy)
+
+    cartera = {
+        t: {"monto": _r(m), "facturas": int(k)}
+        for t, m, k in zip(TRAMOS, a["cartera_monto"], a["cartera_n"])
+    }
+
+    saldo, nombres = a["saldo_cliente"], a["clientes"]
+    if cliente is not None:
+        k = a["codigos"].get(cliente)
+        elegidos = [k] if k is not None and a["abiertas_cliente"][k] else []
+    else:
+        elegidos = a["ranking"][:limit]
+    clientes = [
+        {
+            "cliente": nombres[k],
+            "saldo": _r(saldo[k]),
+            "abiertas": int(a["abiertas_cliente"][k]),
+            "vence_mas_antigua": str(a["mas_antigua"][k]),
+            "tramos": {t: _r(m) for t, m in zip(TRAMOS, a["por_cliente"][k])},
+        }
+        for k in elegidos
+    ]
+
+    # flujo esperado: lo que vence de hoy en adelante, por semana; lo atrasado va aparte
+    semana, monto, vencido = a["semana"], a["monto_abierto"], a["vencido"]
+    futuro = ~vencido & (semana < semanas)
+    flujo_monto = np.bincount(semana[futuro], weights=monto[futuro], minlength=semanas)
+    flujo_n = np.bincount(semana[futuro], minlength=semanas)
+    flujo = [
+        {"semana": str(a["lunes"] + np.timedelta64(7 * i, "D")), "monto": _r(flujo_monto[i]), "facturas": int(flujo_n[i])}
+        for i in range(semanas)
+    ]
+    despues = ~vencido & (semana >= semanas)
+
+    return {
+        "hoy": hoy.isoformat(),
+        "version": version,
+        "tramos": TRAMOS,
+        "cartera": cartera,
+        "total": _r(a["cartera_monto"].sum()),
+        "clientes": clientes,
+        "flujo_semanal": flujo,
+        "atrasado": _r(monto[vencido].sum()),
+        "posterior": _r(monto[despues].sum()),
+    }
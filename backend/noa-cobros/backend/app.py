@@ -1,11 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import date, datetime
-import csv, io
-from db import get_conn, init_schema
+import csv, io, json
+import analytics
+import db
+from cache_http import condicional
+from db import get_conn, init_schema, normalizar_busqueda, tocar_version, version_datos
 from flask_cors import CORS
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "ETag"])
+
+MAX_PAGE = 1000
 
 # Inicializa DB
 init_schema()
@@ -24,19 +29,145 @@ def status():
     return {"ok": True, "service": "Noa Cobros API", "port": 5056}
 
 @app.get("/facturas")
+@condicional(version_datos)
 def listar_facturas():
+    """
+    ?limit=N&after=<vence>,<id>  -> página ordenada por (vence, id); el cursor
+                                    de la página siguiente va en X-Next-Cursor
+    ?format=ndjson               -> una factura por línea, leída del cursor
+    ?q=texto                     -> búsqueda por cliente (FTS5 trigram, sin acentos);
+                                    con orden=relevancia ordena por rank; el rank
+                                    cambia con cada búsqueda, así que ahí 'after'
+                                    es la cantidad de filas ya leídas (offset)
+    """
     q = request.args.get("q", "").strip().lower()
-    with get_conn() as conn:
-        if q:
-            rows = conn.execute(
-                "SELECT * FROM facturas WHERE lower(cliente) LIKE ? ORDER BY vence ASC",
-                (f"%{q}%",)
-            ).fetchall()
+    relevancia = False
+    tabla, where, params = "facturas", [], []
+    if q:
+        qn = normalizar_busqueda(q)
+        if db.FTS_DISPONIBLE and len(qn) >= 3:
+            # el tokenizer trigram necesita al menos 3 caracteres
+            tabla = "facturas JOIN facturas_fts ON facturas_fts.rowid = facturas.id"
+            where.append("facturas_fts MATCH ?")
+            params.append('"' + qn.replace('"', '""') + '"')
+            relevancia = request.args.get("orden") == "relevancia"
         else:
-            rows = conn.execute(
-                "SELECT * FROM facturas ORDER BY vence ASC"
-            ).fetchall()
-        return jsonify([dict(r) for r in rows])
+            where.append("lower(cliente) LIKE ?")
+            params.append(f"%{q}%")
+
+    after = request.args.get("after")
+    try:
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+        offset = int(after) if after and relevancia else 0
+        if after and not relevancia:
+            vence, fid = after.rsplit(",", 1)
+            where.append("(facturas.vence > ? OR (facturas.vence = ? AND facturas.id > ?))")
+            params += [vence, vence, int(fid)]
+    except ValueError:
+        return {"error": "Parámetros 'limit'/'after' inválidos"}, 400
+
+    sql = f"SELECT facturas.* FROM {tabla}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY " + ("facturas_fts.rank, " if relevancia else "") + "facturas.vence ASC, facturas.id ASC"
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE))
+        sql += f" LIMIT {limit}"
+    if offset > 0:
+        sql += ("" if limit is not None else " LIMIT -1") + f" OFFSET {offset}"
+
+    if request.args.get("format") == "ndjson":
+        def generar():
+            for r in get_conn().execute(sql, params):
+                yield json.dumps(dict(r), ensure_ascii=False) + "\n"
+        return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
+
+    with get_conn() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    resp = jsonify([dict(r) for r in rows])
+    if limit is not None and len(rows) == limit:
+        resp.headers["X-Next-Cursor"] = (
+            str(offset + limit) if relevancia else f"{rows[-1]['vence']},{rows[-1]['id']}"
+        )
+    return resp
+
+RESUMEN_POR = {"cliente": "cliente", "mes": "substr(vence, 1, 7)"}
+
+@app.get("/facturas/resumen")
+@condicional(version_datos, variar=lambda: date.today().isoformat())
+def resumen_facturas():
+    """
+    Contadores del tablero (monto total, pendientes, vencidas, por vencer) en
+    una pasada de SQL; quedan en caché hasta la próxima escritura.
+    ?por=cliente|mes  -> además, los mismos contadores por grupo
+                         (?limit=N&after=<grupo> para paginar los grupos)
+    """
+    hoy = date.today().isoformat()
+    por = request.args.get("por")
+    if por and por not in RESUMEN_POR:
+        return {"error": f"Use por={'|'.join(RESUMEN_POR)}"}, 400
+    try:
+        limit = max(1, min(int(request.args.get("limit") or MAX_PAGE), MAX_PAGE))
+    except ValueError:
+        return {"error": "Parámetro 'limit' inválido"}, 400
+
+    with get_conn() as conn:
+        out = {"resumen": _resumen_facturas(conn, hoy)}
+        if por:
+            expr = RESUMEN_POR[por]
+            where, params = "", [hoy, hoy]
+            if request.args.get("after"):
+                where = f"WHERE {expr} > ?"
+                params.append(request.args["after"])
+            grupos = [
+                _contadores(r) for r in conn.execute(
+                    f"SELECT {expr} AS grupo, {_SQL_CONTADORES} FROM facturas {where} "
+                    f"GROUP BY grupo ORDER BY grupo LIMIT {limit}",
+                    params,
+                )
+            ]
+            out["grupos"] = grupos
+            out["next"] = grupos[-1]["grupo"] if len(grupos) == limit else None
+    return out
+
+@app.get("/facturas/changes")
+@condicional(version_datos)
+def cambios_facturas():
+    """
+    Lo que cambió desde ?since=<cursor> (el 'cursor' de la respuesta anterior;
+    0 = todo): 'upserts' con las facturas nuevas o modificadas y 'deletes' con
+    los ids borrados. Sin 'since' devuelve solo el cursor actual, para tomarlo
+    antes de una carga completa. ?limit=N acota la página ('mas' avisa si quedan).
+    El cursor es el seq de 'facturas_cambios'; si es anterior a los borrados ya
+    podados (o del formato viejo '<hora>,<id>') responde 410.
+    """
+    since = request.args.get("since")
+    if since is not None and "," in since:
+        # cursor '<hora>,<id>' de antes del registro por seq
+        return {"error": "Cursor vencido: vuelva a cargar todo", "resync": True}, 410
+    try:
+        limit = max(1, min(int(request.args.get("limit") or MAX_PAGE), MAX_PAGE))
+        seq = 0 if since is None else int(since)
+    except ValueError:
+        return {"error": "Parámetros 'since'/'limit' inválidos"}, 400
+
+    with get_conn() as conn:
+        if since is None:
+            return {"cursor": str(db.ultimo_cambio(conn)), "upserts": [], "deletes": [], "mas": False}
+
+        if db.cursor_vencido(conn, seq):
+            return {"error": "Cursor vencido: vuelva a cargar todo", "resync": True}, 410
+
+        marcas = db.cambios_desde(conn, seq, limit)
+        ids = [m["id"] for m in marcas if m["tipo"] == "u"]
+        filas = {r["id"]: dict(r) for r in _por_ids(conn, "SELECT * FROM facturas WHERE id IN ({marcas})", ids)}
+
+    return {
+        "cursor": str(marcas[-1]["seq"]) if marcas else since,
+        "upserts": [filas[i] for i in ids if i in filas],
+        "deletes": [m["id"] for m in marcas if m["tipo"] == "d"],
+        "mas": len(marcas) == limit,
+    }
 
 @app.post("/facturas")
 def crear_factura():
@@ -60,41 +191,158 @@ def crear_factura():
             "INSERT INTO facturas (cliente, monto, vence, estado) VALUES (?, ?, ?, ?)",
             (cliente, monto, vence, estado)
         )
+        tocar_version(conn)
         conn.commit()
         fid = cur.lastrowid
         row = conn.execute("SELECT * FROM facturas WHERE id=?", (fid,)).fetchone()
         return dict(row), 201
 
-@app.put("/facturas/<int:fid>")
-def actualizar_factura(fid):
-    data = request.get_json(force=True)
-    fields, values = [], []
-    for k in ("cliente", "monto", "vence", "estado"):
+CAMPOS_EDITABLES = ("cliente", "monto", "vence", "estado")
+# facturas por PATCH /facturas; más que esto conviene partir el pedido
+MAX_PATCH = 5000
+# parámetros por IN (...) (SQLITE_MAX_VARIABLE_NUMBER puede ser 999)
+LOTE_IN = 500
+
+def _cambios(data):
+    """Campos editables de 'data' ya validados; ValueError si algo no sirve."""
+    if not isinstance(data, dict):
+        raise ValueError("Se esperaba un objeto JSON con los campos a cambiar")
+    cambios = {}
+    for k in CAMPOS_EDITABLES:
         if k in data and data[k] is not None:
             v = data[k]
             if k == "vence":
                 v = parse_iso(v)
-            if k == "monto":
+            elif k == "monto":
                 v = float(v)
-            fields.append(f"{k}=?")
-            values.append(v)
+            else:
+                v = str(v).strip()
+            cambios[k] = v
+    return cambios
+
+# sumas condicionales de los contadores del tablero ('?' = hoy, dos veces)
+_SQL_CONTADORES = """count(*) AS facturas,
+       coalesce(sum(monto), 0) AS monto_total,
+       coalesce(sum(estado = 'pendiente'), 0) AS pendientes,
+       coalesce(sum(estado = 'pendiente' AND vence < ?), 0) AS vencidas,
+       coalesce(sum(estado = 'pendiente' AND vence >= ?), 0) AS por_vencer,
+       coalesce(sum(CASE WHEN estado = 'pendiente' THEN monto END), 0) AS monto_pendiente"""
+
+def _contadores(r):
+    d = dict(r)
+    d["monto_total"] = round(d["monto_total"], 2)
+    d["monto_pendiente"] = round(d["monto_pendiente"], 2)
+    return d
+
+def _resumen_facturas(conn, hoy=None):
+    """Contadores del tablero en una sola pasada (sumas condicionales)."""
+    hoy = hoy or date.today().isoformat()
+    return _contadores(conn.execute(f"SELECT {_SQL_CONTADORES} FROM facturas", (hoy, hoy)).fetchone())
+
+def _por_ids(conn, sql, ids, params=()):
+    """Ejecuta 'sql' (con {marcas} en el IN) por tandas de ids."""
+    for i in range(0, len(ids), LOTE_IN):
+        lote = ids[i:i + LOTE_IN]
+        yield from conn.execute(sql.format(marcas=",".join("?" * len(lote))), [*params, *lote])
+
+@app.put("/facturas/<int:fid>")
+def actualizar_factura(fid):
+    data = request.get_json(force=True)
+    try:
+        cambios = _cambios(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    if not fields:
+    if not cambios:
         return {"error": "Nada que actualizar"}, 400
 
-    values.append(fid)
     with get_conn() as conn:
-        conn.execute(f"UPDATE facturas SET {', '.join(fields)} WHERE id=?", values)
+        cur = conn.execute(
+            f"UPDATE facturas SET {', '.join(f'{k}=?' for k in cambios)} WHERE id=?", [*cambios.values(), fid]
+        )
+        if cur.rowcount:
+            tocar_version(conn)
         conn.commit()
         row = conn.execute("SELECT * FROM facturas WHERE id=?", (fid,)).fetchone()
         if not row:
             return {"error": "No existe"}, 404
         return dict(row)
 
+@app.patch("/facturas")
+def actualizar_facturas():
+    """
+    Cambio en lote, en una sola transacción:
+      {"ids": [1, 2, ...], "cambios": {"estado": "pagada"}}
+      {"filtro": {"estado", "cliente", "vence_desde", "vence_hasta"}, "cambios": {...}}
+    Devuelve solo las facturas que cambiaron y los contadores del tablero ya
+    actualizados, para parchar la tabla sin volver a pedirla.
+    """
+    data = request.get_json(force=True) or {}
+    if not isinstance(data, dict):
+        return {"error": "Pedido inválido: se esperaba un objeto JSON"}, 400
+    try:
+        cambios = _cambios(data.get("cambios") or {})
+        ids = [int(i) for i in data.get("ids") or []]
+        filtro = data.get("filtro") or {}
+        if not isinstance(filtro, dict):
+            raise ValueError("'filtro' debe ser un objeto")
+        where, params = [], []
+        for k, op in (("estado", "="), ("cliente", "="), ("vence_desde", ">="), ("vence_hasta", "<=")):
+            if filtro.get(k):
+                col = "vence" if k.startswith("vence") else k
+                where.append(f"{col} {op} ?")
+                params.append(parse_iso(filtro[k]) if col == "vence" else str(filtro[k]))
+    except (TypeError, ValueError) as e:
+        return {"error": f"Pedido inválido: {e}"}, 400
+
+    if not cambios:
+        return {"error": f"Indique 'cambios' con alguno de: {', '.join(CAMPOS_EDITABLES)}"}, 400
+    if bool(ids) == bool(where):
+        return {"error": "Indique 'ids' o 'filtro' (uno de los dos)"}, 400
+    if len(ids) > MAX_PATCH:
+        return {"error": f"Máximo {MAX_PATCH} facturas por pedido"}, 400
+
+    # solo se tocan las filas donde algún campo realmente cambia
+    distinto = " OR ".join(f"{k} IS NOT ?" for k in cambios)
+    valores = list(cambios.values())
+    with get_conn() as conn:
+        if ids:
+            encontradas = {
+                r["id"]: r["cambia"] for r in _por_ids(
+                    conn, f"SELECT id, ({distinto}) AS cambia FROM facturas WHERE id IN ({{marcas}})", ids, valores,
+                )
+            }
+            no_encontradas = sorted(set(ids) - set(encontradas))
+            a_cambiar = [fid for fid, cambia in encontradas.items() if cambia]
+        else:
+            a_cambiar = [r["id"] for r in conn.execute(
+                f"SELECT id FROM facturas WHERE {' AND '.join(where)} AND ({distinto}) LIMIT {MAX_PATCH + 1}",
+                [*params, *valores],
+            )]
+            if len(a_cambiar) > MAX_PATCH:
+                return {"error": f"El filtro abarca más de {MAX_PATCH} facturas; acótelo"}, 400
+            no_encontradas = []
+
+        conn.executemany(
+            f"UPDATE facturas SET {', '.join(f'{k}=?' for k in cambios)} WHERE id=?",
+            ([*valores, fid] for fid in a_cambiar),
+        )
+        if a_cambiar:
+            tocar_version(conn)
+        conn.commit()
+
+        filas = [dict(r) for r in _por_ids(conn, "SELECT * FROM facturas WHERE id IN ({marcas})", a_cambiar)]
+        resumen = _resumen_facturas(conn)
+
+    return {"ok": True, "cambiadas": len(filas), "facturas": filas,
+            "no_encontradas": no_encontradas, "resumen": resumen}
+
 @app.delete("/facturas/<int:fid>")
 def borrar_factura(fid):
     with get_conn() as conn:
         cur = conn.execute("DELETE FROM facturas WHERE id=?", (fid,))
+        if cur.rowcount:
+            tocar_version(conn)
         conn.commit()
         if cur.rowcount == 0:
             return {"error": "No existe"}, 404
@@ -123,35 +371,153 @@ def subir_csv():
                 (cliente, monto, vence)
             )
             inserted += 1
+        tocar_version(conn)
         conn.commit()
 
     return {"ok": True, "insertadas": inserted}
 
+def _rango_mes(mes):
+    y, m = (int(x) for x in mes.split("-"))
+    if not 1 <= m <= 12:
+        raise ValueError(mes)
+    sig = (y + 1, 1) if m == 12 else (y, m + 1)
+    return f"{y}-{m:02d}", f"{y}-{m:02d}-01", f"{sig[0]}-{sig[1]:02d}-01"
+
 @app.get("/reporte/mensual")
+@condicional(version_datos, variar=lambda: date.today().isoformat())
 def reporte_mensual():
-    mes = request.args.get("mes")
+    """
+    Resumen del mes desde 'resumen_mensual' (mantenida por triggers).
+    ?detalle=1&limit=N&after=<vence>,<id> agrega las facturas del mes paginadas.
+    """
     hoy = date.today().isoformat()
-    y, m = (mes.split("-") if mes else hoy[:7].split("-"))
-    like = f"{y}-{int(m):02d}%"
+    try:
+        mes, desde, hasta = _rango_mes(request.args.get("mes") or hoy[:7])
+        limit = max(1, min(int(request.args.get("limit") or MAX_PAGE), MAX_PAGE))
+        after = request.args.get("after")
+        if after:
+            vence, fid = after.rsplit(",", 1)
+            fid = int(fid)
+    except ValueError:
+        return {"error": "Parámetros inválidos. Use mes=aaaa-mm y after=<vence>,<id>"}, 400
 
     with get_conn() as conn:
-        rows = conn.execute("SELECT * FROM facturas WHERE vence LIKE ?", (like,)).fetchall()
+        r = conn.execute("SELECT * FROM resumen_mensual WHERE mes = ?", (mes,)).fetchone()
+        total_facturas, monto_total, pendientes = (
+            (r["total_facturas"], r["monto_total"], r["pendientes"]) if r else (0, 0.0, 0)
+        )
+
+        # vencidas/por_vencer dependen de hoy: solo el mes en curso necesita consultar
+        if hasta <= hoy:
+            vencidas, por_vencer = pendientes, 0
+        elif desde > hoy:
+            vencidas, por_vencer = 0, pendientes
+        else:
+            vencidas, por_vencer = conn.execute(
+                """SELECT coalesce(sum(vence < ?), 0), coalesce(sum(vence >= ?), 0)
+                   FROM facturas WHERE estado = 'pendiente' AND vence >= ? AND vence < ?""",
+                (hoy, hoy, desde, hasta),
+            ).fetchone()
+
+        resumen = {
+            "mes": mes,
+            "total_facturas": total_facturas,
+            "monto_total": round(monto_total, 2),
+            "pendientes": pendientes,
+            "vencidas": vencidas,
+            "por_vencer": por_vencer,
+        }
+        if request.args.get("detalle") != "1":
+            return {"resumen": resumen}
+
+        sql, params = "SELECT * FROM facturas WHERE vence >= ? AND vence < ?", [desde, hasta]
+        if after:
+            sql += " AND (vence > ? OR (vence = ? AND id > ?))"
+            params += [vence, vence, fid]
+        rows = conn.execute(sql + f" ORDER BY vence, id LIMIT {limit}", params).fetchall()
 
     data = [dict(r) for r in rows]
-    total = sum(r["monto"] for r in data) if data else 0.0
-    hoy_iso = date.today().isoformat()
-    vencidas = [r for r in data if r["vence"] < hoy_iso and r["estado"] == "pendiente"]
-    por_vencer = [r for r in data if r["vence"] >= hoy_iso and r["estado"] == "pendiente"]
-
-    resumen = {
-        "mes": f"{y}-{int(m):02d}",
-        "total_facturas": len(data),
-        "monto_total": round(total, 2),
-        "pendientes": len([r for r in data if r['estado'] == 'pendiente']),
-        "vencidas": len(vencidas),
-        "por_vencer": len(por_vencer),
-    }
-    return {"resumen": resumen, "facturas": data}
+    nxt = f"{data[-1]['vence']},{data[-1]['id']}" if len(data) == limit else None
+    return {"resumen": resumen, "facturas": data, "next": nxt}
+
+CLIENTES_ORDEN = {"saldo": "saldo", "vence": "vence_mas_antigua", "abiertas": "abiertas", "cliente": "cliente"}
+
+@app.get("/clientes/resumen")
+@condicional(version_datos, variar=lambda: date.today().isoformat())
+def clientes_resumen():
+    """
+    Cuenta por cliente desde 'clientes' (mantenida por triggers), solo clientes
+    con facturas abiertas.
+    ?orden=saldo|vence|abiertas|cliente  (por defecto saldo)
+    ?dir=asc|desc                        (por defecto desc; asc para vence y cliente)
+    ?limit=N&after=<cursor>              -> keyset sobre el índice del orden, costo por página constante
+    ?cliente=X                           -> solo ese cliente
+    """
+    orden = request.args.get("orden", "saldo")
+    col = CLIENTES_ORDEN.get(orden)
+    default_dir = "asc" if orden in ("vence", "cliente") else "desc"
+    direccion = request.args.get("dir", default_dir).lower()
+    if col is None or direccion not in ("asc", "desc"):
+        return {"error": f"Use orden={'|'.join(CLIENTES_ORDEN)} y dir=asc|desc"}, 400
+
+    where, params = ["abiertas > 0"], []
+    if request.args.get("cliente"):
+        where.append("cliente = ?")
+        params.append(request.args["cliente"])
+
+    op = "<" if direccion == "desc" else ">"
+    after = request.args.get("after")
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 100), MAX_PAGE))
+        if after:
+            if col == "cliente":
+                where.append(f"cliente {op} ?")
+                params.append(after)
+            else:
+                valor, cliente = after.split(",", 1)
+                valor = float(valor) if col in ("saldo", "abiertas") else valor
+                # la cota '<=' / '>=' redundante deja que sqlite salte directo en el índice
+                where.append(f"{col} {op}= ? AND ({col} {op} ? OR ({col} = ? AND cliente {op} ?))")
+                params += [valor, valor, valor, cliente]
+    except ValueError:
+        return {"error": "Parámetros 'limit'/'after' inválidos"}, 400
+
+    orden_sql = f"cliente {direccion}" if col == "cliente" else f"{col} {direccion}, cliente {direccion}"
+    with get_conn() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM clientes WHERE {' AND '.join(where)} ORDER BY {orden_sql} LIMIT {limit}",
+            params,
+        ).fetchall()
+
+    hoy = date.today()
+    data = []
+    for r in rows:
+        d = dict(r)
+        d["saldo"] = round(d["saldo"], 2)
+        d["dias_atraso"] = max(0, (hoy - date.fromisoformat(d["vence_mas_antigua"])).days)
+        data.append(d)
+    nxt = None
+    if len(data) == limit:
+        u = data[-1]
+        nxt = u["cliente"] if col == "cliente" else f"{rows[-1][col]},{u['cliente']}"
+    return {"clientes": data, "next": nxt}
+
+@app.get("/analytics/aging")
+@condicional(version_datos, variar=lambda: date.today().isoformat())
+def analytics_aging():
+    """
+    Antigüedad de saldos abiertos por tramo (al día, 1-30, 31-60, 61-90, 90+)
+    en toda la cartera y por cliente, más el flujo esperado por semana.
+    ?limit=N      -> los N clientes de mayor saldo (por defecto 100)
+    ?cliente=X    -> solo ese cliente
+    ?semanas=N    -> semanas de flujo esperado (por defecto 12, hasta 52)
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 100), MAX_PAGE))
+        semanas = max(1, min(int(request.args.get("semanas") or 12), 52))
+    except ValueError:
+        return {"error": "Parámetros 'limit'/'semanas' inválidos"}, 400
+    return analytics.aging(cliente=request.args.get("cliente"), limit=limit, semanas=semanas)
 
 @app.post("/whatsapp/simulado")
 def whatsapp_simulado():
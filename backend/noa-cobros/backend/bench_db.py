@@ -0,0 +1,95 @@
+"""
+Benchmark de concurrencia: lecturas/seg de GET /facturas mientras un upload
+escribe, con la conexión anterior (una nueva por request, journal por
+defecto) y con db.get_conn (pool por hilo + WAL).
+
+    python bench_db.py [segundos] [lectores]
+"""
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import db
+
+FILAS = 50_000
+LOTE_ESCRITURA = 2_000
+LECTURA = "SELECT * FROM facturas ORDER BY vence ASC, id ASC LIMIT 100"
+
+
+def _conn_anterior():
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _preparar(path: Path):
+    db.DB_PATH = path
+    db.init_schema()
+    with db.get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO facturas (cliente, monto, vence) VALUES (?, ?, ?)",
+            ((f"Cliente {i % 5000}", 1000 + i, f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}") for i in range(FILAS)),
+        )
+
+
+def _correr(get_conn, segundos: float, lectores: int) -> dict:
+    fin = time.monotonic() + segundos
+    lecturas, bloqueos, escrituras = [0] * lectores, [0] * lectores, [0]
+
+    def escritor():
+        while time.monotonic() < fin:
+            conn = get_conn()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO facturas (cliente, monto, vence) VALUES (?, ?, ?)",
+                        (("Upload", 1.0, "2026-06-15") for _ in range(LOTE_ESCRITURA)),
+                    )
+                escrituras[0] += LOTE_ESCRITURA
+            except sqlite3.OperationalError:
+                pass
+
+    def lector(i):
+        while time.monotonic() < fin:
+            try:
+                with get_conn() as conn:
+                    conn.execute(LECTURA).fetchall()
+                lecturas[i] += 1
+            except sqlite3.OperationalError:
+                bloqueos[i] += 1
+
+    hilos = [threading.Thread(target=escritor)] + [threading.Thread(target=lector, args=(i,)) for i in range(lectores)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return {
+        "lecturas_seg": sum(lecturas) / segundos,
+        "bloqueos": sum(bloqueos),
+        "filas_escritas": escrituras[0],
+    }
+
+
+def main(segundos: float = 5, lectores: int = 4):
+    with tempfile.TemporaryDirectory() as tmp:
+        # antes: el archivo queda en modo rollback-journal (sin los PRAGMA de db.connect)
+        antes_db = Path(tmp) / "antes.db"
+        _preparar(antes_db)
+        db.get_conn().execute("PRAGMA journal_mode=DELETE")
+        antes = _correr(_conn_anterior, segundos, lectores)
+
+        _preparar(Path(tmp) / "despues.db")
+        despues = _correr(db.get_conn, segundos, lectores)
+
+    for nombre, r in (("antes", antes), ("después", despues)):
+        print(f"{nombre:8} lecturas/seg={r['lecturas_seg']:9.1f}  bloqueos={r['bloqueos']:5}  filas escritas={r['filas_escritas']}")
+
+
+if __name__ == "__main__":
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+    )
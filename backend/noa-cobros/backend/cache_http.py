@@ -0,0 +1,105 @@
+"""
+GET condicional y caché de respuestas en proceso.
+
+La clave de cada respuesta es (ruta, query, versión de datos): cualquier
+escritura sube la versión (db.tocar_version) y deja viejas todas las claves
+sin tener que recorrer la caché; el LRU las va descartando solo.
+
+Copia del cache_http.py de la app raíz: este backend se despliega solo
+(Procfile y requirements propios) y no importa nada de la raíz.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+MAX_ENTRADAS = int(os.getenv("CACHE_ENTRADAS", 256))
+# respuestas más grandes que esto no se guardan (listados completos)
+MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 4 * 1024 * 1024))
+# tope de todos los cuerpos guardados en el proceso (por worker)
+MAX_BYTES_TOTAL = int(os.getenv("CACHE_MAX_BYTES_TOTAL", 32 * 1024 * 1024))
+
+
+class LRU:
+    """LRU acotado por cantidad de entradas y por bytes totales; put() recibe el tamaño."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS, max_bytes=MAX_BYTES_TOTAL):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = self.fallos = 0
+
+    def get(self, clave):
+        with self._lock:
+            par = self._datos.get(clave)
+            if par is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return par[0]
+
+    def put(self, clave, valor, tamano=0):
+        with self._lock:
+            if tamano > self.max_bytes:
+                return
+            viejo = self._datos.pop(clave, None)
+            if viejo is not None:
+                self.bytes -= viejo[1]
+            self._datos[clave] = (valor, tamano)
+            self.bytes += tamano
+            while len(self._datos) > self.max_entradas or self.bytes > self.max_bytes:
+                _, (_, t) = self._datos.popitem(last=False)
+                self.bytes -= t
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+
+cache = LRU()
+
+
+def condicional(version, variar=None):
+    """
+    Decorador para vistas GET. 'version()' devuelve la versión actual de los
+    datos; 'variar()' agrega a la clave lo que no está en la query (p. ej. la
+    fecha de hoy). Emite ETag fuerte, responde 304 a If-None-Match y sirve
+    desde el LRU el cuerpo ya serializado.
+    """
+    def deco(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            # la versión se lee antes de consultar: si alguien escribe en el medio,
+            # lo guardado queda bajo la versión vieja y nunca se sirve de más
+            clave = (request.path, tuple(sorted(request.args.items(multi=True))), version(),
+                     variar() if variar else None)
+            etag = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()[:24]
+
+            if request.if_none_match.contains(etag):
+                resp = make_response("", 304)
+            else:
+                guardada = cache.get(clave)
+                if guardada is not None:
+                    cuerpo, headers = guardada
+                    resp = Response(cuerpo, status=200, headers=headers)
+                else:
+                    resp = make_response(vista(*args, **kwargs))
+                    if resp.status_code != 200:
+                        return resp
+                    if not resp.is_streamed and resp.content_length is not None and resp.content_length <= MAX_BYTES:
+                        cuerpo = resp.get_data()
+                        cache.put(clave, (cuerpo, list(resp.headers.items())), len(cuerpo))
+
+            resp.set_etag(etag)
+            # el navegador guarda la respuesta pero revalida siempre (304 si no cambió)
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+        return envoltura
+    return deco
@@ -1,11 +1,48 @@
+import os
 import sqlite3
+import threading
+import unicodedata
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "noa_cobros.db"
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+# Ajustes de conexión. WAL deja que los lectores sigan leyendo mientras
+# un upload escribe; con WAL, synchronous=NORMAL sigue siendo seguro ante caídas.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", 32768)),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_BYTES", 256 * 1024 * 1024)),
+    "temp_store": "MEMORY",
+}
+# sentencias preparadas que sqlite3 mantiene en caché por conexión
+STATEMENT_CACHE = 256
+
+_local = threading.local()
+
+def connect(path=None):
+    """Conexión nueva ya configurada (para scripts y benchmarks)."""
+    conn = sqlite3.connect(path or DB_PATH, cached_statements=STATEMENT_CACHE)
     conn.row_factory = sqlite3.Row
+    for k, v in PRAGMAS.items():
+        conn.execute(f"PRAGMA {k}={v}")
+    return conn
+
+def get_conn():
+    """
+    Conexión reutilizada por hilo (y por proceso: tras un fork de gunicorn se
+    abre otra). Se usa igual que antes, con 'with get_conn() as conn:'; no
+    hay que cerrarla.
+    """
+    key = (os.getpid(), str(DB_PATH))
+    conn = getattr(_local, "conns", {}).get(key)
+    if conn is None:
+        conn = connect()
+        _local.conns = {key: conn}
+    elif conn.in_transaction:
+        # no heredar una transacción que otro request dejó abierta
+        conn.rollback()
     return conn
 
 def init_schema():
@@ -17,7 +54,361 @@ def init_schema():
             monto REAL NOT NULL,
             vence TEXT NOT NULL,
             estado TEXT NOT NULL DEFAULT 'pendiente',
-            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
         );
         """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_facturas_vence_id ON facturas(vence, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_facturas_estado_vence ON facturas(estado, vence)")
+        init_resumen_mensual(conn)
+        init_clientes(conn)
+        init_busqueda(conn)
+        init_version(conn)
+        init_cambios(conn)
         conn.commit()
+
+def init_resumen_mensual(conn):
+    """
+    Tabla 'resumen_mensual' (una fila por mes de vence) mantenida por triggers
+    en cada INSERT/UPDATE/DELETE de 'facturas'. Si es nueva se llena de una vez.
+    """
+    nueva = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='resumen_mensual'"
+    ).fetchone() is None
+
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS resumen_mensual (
+        mes TEXT PRIMARY KEY,
+        total_facturas INTEGER NOT NULL DEFAULT 0,
+        monto_total REAL NOT NULL DEFAULT 0,
+        pendientes INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_ins AFTER INSERT ON facturas BEGIN
+        INSERT INTO resumen_mensual (mes, total_facturas, monto_total, pendientes)
+        VALUES (substr(NEW.vence, 1, 7), 1, NEW.monto, NEW.estado = 'pendiente')
+        ON CONFLICT(mes) DO UPDATE SET
+            total_facturas = total_facturas + 1,
+            monto_total = monto_total + excluded.monto_total,
+            pendientes = pendientes + excluded.pendientes;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_del AFTER DELETE ON facturas BEGIN
+        UPDATE resumen_mensual SET
+            total_facturas = total_facturas - 1,
+            monto_total = monto_total - OLD.monto,
+            pendientes = pendientes - (OLD.estado = 'pendiente')
+        WHERE mes = substr(OLD.vence, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_upd AFTER UPDATE OF vence, monto, estado ON facturas BEGIN
+        UPDATE resumen_mensual SET
+            total_facturas = total_facturas - 1,
+            monto_total = monto_total - OLD.monto,
+            pendientes = pendientes - (OLD.estado = 'pendiente')
+        WHERE mes = substr(OLD.vence, 1, 7);
+        INSERT INTO resumen_mensual (mes, total_facturas, monto_total, pendientes)
+        VALUES (substr(NEW.vence, 1, 7), 1, NEW.monto, NEW.estado = 'pendiente')
+        ON CONFLICT(mes) DO UPDATE SET
+            total_facturas = total_facturas + 1,
+            monto_total = monto_total + excluded.monto_total,
+            pendientes = pendientes + excluded.pendientes;
+    END;
+    """)
+
+    if nueva:
+        conn.execute("""
+        INSERT INTO resumen_mensual (mes, total_facturas, monto_total, pendientes)
+        SELECT substr(vence, 1, 7), count(*), sum(monto), sum(estado = 'pendiente')
+        FROM facturas GROUP BY substr(vence, 1, 7)
+        """)
+
+# ---------------------------
+# Cuenta por cliente
+# ---------------------------
+# Una factura está abierta mientras no esté 'pagada'.
+_ABIERTA_NEW = "NEW.estado <> 'pagada'"
+_ABIERTA_OLD = "OLD.estado <> 'pagada'"
+
+def _sql_restar_old():
+    # si se va la factura abierta más antigua, se busca la siguiente solo de ese cliente
+    return f"""
+        UPDATE clientes SET
+            total_facturas = total_facturas - 1,
+            abiertas = abiertas - ({_ABIERTA_OLD}),
+            saldo = saldo - CASE WHEN {_ABIERTA_OLD} THEN OLD.monto ELSE 0 END,
+            vence_mas_antigua = CASE
+                WHEN {_ABIERTA_OLD} AND OLD.vence = vence_mas_antigua THEN
+                    (SELECT min(vence) FROM facturas WHERE cliente = OLD.cliente AND estado <> 'pagada')
+                ELSE vence_mas_antigua END
+        WHERE cliente = OLD.cliente;"""
+
+def _sql_sumar_new(ultimo_pago="ultimo_pago", ultimo_pago_monto="ultimo_pago_monto"):
+    return f"""
+        INSERT INTO clientes (cliente, total_facturas, abiertas, saldo, vence_mas_antigua)
+        VALUES (NEW.cliente, 1, {_ABIERTA_NEW},
+                CASE WHEN {_ABIERTA_NEW} THEN NEW.monto ELSE 0 END,
+                CASE WHEN {_ABIERTA_NEW} THEN NEW.vence END)
+        ON CONFLICT(cliente) DO UPDATE SET
+            total_facturas = total_facturas + 1,
+            abiertas = abiertas + excluded.abiertas,
+            saldo = saldo + excluded.saldo,
+            vence_mas_antigua = CASE
+                WHEN excluded.vence_mas_antigua IS NULL THEN vence_mas_antigua
+                WHEN vence_mas_antigua IS NULL OR excluded.vence_mas_antigua < vence_mas_antigua
+                    THEN excluded.vence_mas_antigua
+                ELSE vence_mas_antigua END,
+            ultimo_pago = {ultimo_pago},
+            ultimo_pago_monto = {ultimo_pago_monto};"""
+
+def init_clientes(conn):
+    """
+    Tabla 'clientes' (saldo, facturas abiertas, vencimiento abierto más
+    antiguo y último pago por cliente) mantenida por triggers en cada
+    INSERT/UPDATE/DELETE de 'facturas'. Si es nueva se llena de una vez.
+    """
+    nueva = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='clientes'"
+    ).fetchone() is None
+
+    pago = f"{_ABIERTA_OLD} AND NOT {_ABIERTA_NEW}"
+    conn.executescript(f"""
+    CREATE TABLE IF NOT EXISTS clientes (
+        cliente TEXT PRIMARY KEY,
+        total_facturas INTEGER NOT NULL DEFAULT 0,
+        abiertas INTEGER NOT NULL DEFAULT 0,
+        saldo REAL NOT NULL DEFAULT 0,
+        vence_mas_antigua TEXT,
+        ultimo_pago TEXT,
+        ultimo_pago_monto REAL
+    );
+
+    -- órdenes de GET /clientes/resumen (solo clientes con deuda)
+    CREATE INDEX IF NOT EXISTS ix_clientes_saldo ON clientes(saldo, cliente) WHERE abiertas > 0;
+    CREATE INDEX IF NOT EXISTS ix_clientes_vence ON clientes(vence_mas_antigua, cliente) WHERE abiertas > 0;
+    CREATE INDEX IF NOT EXISTS ix_clientes_abiertas ON clientes(abiertas, cliente) WHERE abiertas > 0;
+    CREATE INDEX IF NOT EXISTS ix_clientes_cliente ON clientes(cliente) WHERE abiertas > 0;
+    -- siguiente factura abierta de un cliente cuando se paga/borra la más antigua
+    CREATE INDEX IF NOT EXISTS ix_facturas_cliente_abiertas ON facturas(cliente, vence) WHERE estado <> 'pagada';
+
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_ins AFTER INSERT ON facturas BEGIN
+        {_sql_sumar_new()}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_del AFTER DELETE ON facturas BEGIN
+        {_sql_restar_old()}
+        DELETE FROM clientes WHERE cliente = OLD.cliente AND total_facturas <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_upd AFTER UPDATE OF cliente, monto, vence, estado ON facturas BEGIN
+        {_sql_restar_old()}
+        {_sql_sumar_new(
+            ultimo_pago=f"CASE WHEN {pago} THEN datetime('now') ELSE ultimo_pago END",
+            ultimo_pago_monto=f"CASE WHEN {pago} THEN OLD.monto ELSE ultimo_pago_monto END",
+        )}
+        DELETE FROM clientes WHERE cliente = OLD.cliente AND total_facturas <= 0;
+    END;
+    """)
+
+    if nueva:
+        conn.execute("""
+        INSERT INTO clientes (cliente, total_facturas, abiertas, saldo, vence_mas_antigua)
+        SELECT cliente, count(*), sum(estado <> 'pagada'),
+               coalesce(sum(CASE WHEN estado <> 'pagada' THEN monto END), 0),
+               min(CASE WHEN estado <> 'pagada' THEN vence END)
+        FROM facturas GROUP BY cliente
+        """)
+
+# ---------------------------
+# Cambios para sincronizar (GET /facturas/changes)
+# ---------------------------
+AHORA_MS = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+# días que se guardan los borrados; un cursor más viejo debe recargar todo
+# (queda fijo en el trigger al crearlo)
+DIAS_BORRADOS = int(os.getenv("DIAS_BORRADOS", 30))
+
+def init_cambios(conn):
+    """
+    'updated_at' (ms) mantenido por triggers en cada INSERT/UPDATE, y el
+    registro 'facturas_cambios': cada alta, cambio o borrado toma el siguiente
+    'seq' (AUTOINCREMENT, nunca baja ni se repite) y reemplaza la marca
+    anterior del mismo id. El cursor es ese seq, no la hora: dos escrituras
+    en el mismo ms o un salto del reloj no hacen perder cambios.
+    """
+    cols = [r["name"] for r in conn.execute("PRAGMA table_info(facturas)")]
+    if "updated_at" not in cols:
+        # ALTER no admite defaults no constantes: lo pone el trigger de INSERT
+        conn.execute("ALTER TABLE facturas ADD COLUMN updated_at TEXT")
+        conn.execute("UPDATE facturas SET updated_at = created_at || '.000'")
+
+    nueva = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='facturas_cambios'"
+    ).fetchone() is None
+    poda = f"strftime('%Y-%m-%d %H:%M:%f', 'now', '-{DIAS_BORRADOS} days')"
+    conn.executescript(f"""
+    CREATE TABLE IF NOT EXISTS facturas_cambios (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id INTEGER NOT NULL UNIQUE,
+        tipo TEXT NOT NULL CHECK (tipo IN ('u', 'd')),
+        at TEXT NOT NULL DEFAULT ({AHORA_MS})
+    );
+    CREATE INDEX IF NOT EXISTS ix_facturas_cambios_borrados ON facturas_cambios(at) WHERE tipo = 'd';
+
+    -- seq del último borrado ya podado: un cursor anterior debe recargar todo
+    CREATE TABLE IF NOT EXISTS facturas_cambios_poda (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO facturas_cambios_poda (id, seq) VALUES (1, 0);
+
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_ins AFTER INSERT ON facturas
+    WHEN NEW.updated_at IS NULL BEGIN
+        UPDATE facturas SET updated_at = {AHORA_MS} WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_upd AFTER UPDATE ON facturas
+    WHEN NEW.updated_at IS OLD.updated_at BEGIN
+        UPDATE facturas SET updated_at = {AHORA_MS} WHERE id = NEW.id;
+    END;
+
+    -- DELETE + INSERT y no INSERT OR REPLACE: un 'INSERT OR IGNORE INTO
+    -- facturas' impondría su IGNORE y la marca vieja quedaría con su seq
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_log_ins AFTER INSERT ON facturas BEGIN
+        DELETE FROM facturas_cambios WHERE id = NEW.id;
+        INSERT INTO facturas_cambios (id, tipo) VALUES (NEW.id, 'u');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_log_upd AFTER UPDATE ON facturas BEGIN
+        DELETE FROM facturas_cambios WHERE id = NEW.id;
+        INSERT INTO facturas_cambios (id, tipo) VALUES (NEW.id, 'u');
+    END;
+
+    DROP TRIGGER IF EXISTS trg_cambios_del;
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_log_del AFTER DELETE ON facturas BEGIN
+        DELETE FROM facturas_cambios WHERE id = OLD.id;
+        INSERT INTO facturas_cambios (id, tipo) VALUES (OLD.id, 'd');
+        UPDATE facturas_cambios_poda SET seq = max(seq, coalesce(
+            (SELECT max(seq) FROM facturas_cambios WHERE tipo = 'd' AND at < {poda}), 0))
+        WHERE id = 1;
+        DELETE FROM facturas_cambios WHERE tipo = 'd' AND at < {poda};
+    END;
+    DROP INDEX IF EXISTS ix_facturas_updated;
+    """)
+
+    if nueva:
+        # base anterior al registro: una marca por factura y por borrado guardado, en orden de hora
+        borradas = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='facturas_borradas'"
+        ).fetchone() is not None
+        conn.execute(f"""
+        INSERT INTO facturas_cambios (id, tipo, at)
+        SELECT id, tipo, at FROM (
+            SELECT id, 'u' AS tipo, updated_at AS at FROM facturas
+            {"UNION ALL SELECT id, 'd', borrado_at FROM facturas_borradas WHERE id NOT IN (SELECT id FROM facturas)"
+             if borradas else ""}
+        ) ORDER BY at, id
+        """)
+        conn.execute("DROP TABLE IF EXISTS facturas_borradas")
+
+def ultimo_cambio(conn) -> int:
+    """seq de la última marca (0 si nunca hubo nada): el cursor para leer solo lo que venga después."""
+    r = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'facturas_cambios'").fetchone()
+    return r[0] if r else 0
+
+def cursor_vencido(conn, seq: int) -> bool:
+    """True si ya se podaron borrados posteriores a 'seq': hay que recargar todo."""
+    podado = conn.execute("SELECT seq FROM facturas_cambios_poda WHERE id = 1").fetchone()[0]
+    return 0 < seq < podado
+
+def cambios_desde(conn, seq: int, limit=None):
+    """
+    Marcas (seq, tipo 'u' alta/cambio o 'd' borrado, id) posteriores al
+    cursor 'seq', en orden. seq=0 lee desde el principio.
+    """
+    return conn.execute(
+        f"SELECT seq, tipo, id FROM facturas_cambios WHERE seq > ? ORDER BY seq"
+        f"{f' LIMIT {int(limit)}' if limit else ''}",
+        (seq,),
+    ).fetchall()
+
+# ---------------------------
+# Versión de los datos (ETag / caché de respuestas)
+# ---------------------------
+def init_version(conn):
+    """
+    Fila única con la versión que cache_http usa de ETag y clave de caché;
+    cada escritura la sube con tocar_version. Empieza en epoch en ms: si se
+    borra noa_cobros.db, ningún ETag viejo vuelve a coincidir.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS version_datos (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """)
+    conn.execute(
+        "INSERT OR IGNORE INTO version_datos (id, version) "
+        "VALUES (1, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))"
+    )
+
+def tocar_version(conn):
+    """Llamar dentro de la misma transacción que la escritura."""
+    conn.execute("UPDATE version_datos SET version = version + 1 WHERE id = 1")
+
+def version_datos():
+    return get_conn().execute("SELECT version FROM version_datos WHERE id = 1").fetchone()[0]
+
+# ---------------------------
+# Búsqueda por cliente (FTS5 trigram)
+# ---------------------------
+# Se indexa el texto sin acentos y en minúsculas, así la búsqueda no
+# distingue 'Pérez' de 'perez'. La normalización se hace en SQL para que los
+# triggers funcionen desde cualquier cliente sqlite, sin funciones de Python.
+_ACENTOS = {"á": "a", "é": "e", "í": "i", "ó": "o", "ú": "u", "ü": "u", "ñ": "n",
+            "Á": "a", "É": "e", "Í": "i", "Ó": "o", "Ú": "u", "Ü": "u", "Ñ": "n"}
+
+FTS_DISPONIBLE = False
+
+def _sql_normalizado(expr):
+    for a, b in _ACENTOS.items():
+        expr = f"replace({expr}, '{a}', '{b}')"
+    return f"lower({expr})"
+
+def normalizar_busqueda(texto):
+    """Misma normalización que los triggers, para el texto buscado."""
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+
+def init_busqueda(conn):
+    """
+    Índice 'facturas_fts' (rowid = facturas.id) mantenido por triggers. Si el
+    SQLite no trae el tokenizer trigram (< 3.34), se sigue buscando con LIKE.
+    """
+    global FTS_DISPONIBLE
+    nueva = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='facturas_fts'"
+    ).fetchone() is None
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS facturas_fts USING fts5(cliente, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        FTS_DISPONIBLE = False
+        return
+
+    norm_new = _sql_normalizado("NEW.cliente")
+    conn.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_fts_ins AFTER INSERT ON facturas BEGIN
+        INSERT INTO facturas_fts (rowid, cliente) VALUES (NEW.id, {norm_new});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_fts_del AFTER DELETE ON facturas BEGIN
+        DELETE FROM facturas_fts WHERE rowid = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_fts_upd AFTER UPDATE OF cliente ON facturas BEGIN
+        UPDATE facturas_fts SET cliente = {norm_new} WHERE rowid = NEW.id;
+    END;
+    """)
+
+    if nueva:
+        conn.execute(f"INSERT INTO facturas_fts (rowid, cliente) SELECT id, {_sql_normalizado('cliente')} FROM facturas")
+    FTS_DISPONIBLE = True
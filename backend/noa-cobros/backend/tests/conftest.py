@@ -0,0 +1,31 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="noa-cobros-tests-"), "noa_cobros.db")
+
+import app as noa  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with db.get_conn() as conn:
+        conn.execute("DELETE FROM facturas")
+        db.tocar_version(conn)
+    return noa.app.test_client()
+
+
+@pytest.fixture
+def subir(client):
+    """Sube un CSV (texto) por /facturas/csv."""
+    def _subir(csv: str):
+        r = client.post("/facturas/csv", data={"file": (io.BytesIO(csv.encode("utf-8")), "facturas.csv")})
+        assert r.status_code == 200, r.get_json()
+    return _subir
@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+import analytics
+
+
+def test_foto_incremental_igual_a_recarga(client, subir):
+    hoy = date.today()
+    filas = [f"K{i % 5},{i + 1},{(hoy - timedelta(days=i * 3)).isoformat()}" for i in range(60)]
+    subir("cliente,monto,vence\n" + "\n".join(filas) + "\n")
+    client.get("/analytics/aging")
+
+    ids = [f["id"] for f in client.get("/facturas?limit=5").get_json()]
+    client.patch("/facturas", json={"ids": ids[:3], "cambios": {"estado": "pagada"}})
+    client.delete(f"/facturas/{ids[3]}")
+    client.post("/facturas", json={"cliente": "Nuevo", "monto": 50, "vence": (hoy + timedelta(days=2)).isoformat()})
+    r = client.get("/analytics/aging").get_json()
+
+    nueva = analytics.Foto()
+    nueva.refrescar()
+    for col in ("ids", "monto", "vence", "abierta"):
+        assert (getattr(nueva, col) == getattr(analytics.foto, col)).all()
+    assert r["total"] == round(float(nueva.monto[nueva.abierta].sum()), 2)
+    assert r["cartera"]["al_dia"]["facturas"] == 2  # vence hoy y la nueva
+
+
+def test_foto_no_pierde_cambio_en_el_mismo_ms(client, subir):
+    import db
+
+    subir("cliente,monto,vence\nA,10,2026-01-10\nB,20,2026-01-10\n")
+    a, b = sorted(f["id"] for f in client.get("/facturas").get_json())
+    foto = analytics.Foto()
+    foto.refrescar()
+
+    client.put(f"/facturas/{b}", json={"estado": "pagada"})
+    foto.refrescar()
+    # A (id menor) se paga con la misma updated_at que B
+    with db.get_conn() as conn:
+        conn.execute("UPDATE facturas SET estado = 'pagada', updated_at = (SELECT updated_at FROM facturas WHERE id = ?) "
+                     "WHERE id = ?", (b, a))
+        db.tocar_version(conn)
+    foto.refrescar()
+    assert foto.recargas == 1 and foto.incrementales == 2
+    assert not foto.abierta.any()
@@ -0,0 +1,64 @@
+import db
+
+
+def _cambios(client, since):
+    r = client.get(f"/facturas/changes?since={since}")
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def _crear(client, cliente):
+    r = client.post("/facturas", json={"cliente": cliente, "monto": 10, "vence": "2026-01-10"})
+    return r.get_json()["id"]
+
+
+def test_mismo_ms_con_id_menor_no_se_pierde(client):
+    a, b = _crear(client, "A"), _crear(client, "B")
+    cursor = client.get("/facturas/changes").get_json()["cursor"]
+
+    client.put(f"/facturas/{b}", json={"estado": "pagada"})
+    j = _cambios(client, cursor)
+    assert [f["id"] for f in j["upserts"]] == [b]
+
+    # A (id menor) cambia con la misma updated_at que B: con un cursor (hora, id) se salteaba
+    with db.get_conn() as conn:
+        conn.execute("UPDATE facturas SET estado = 'pagada', updated_at = (SELECT updated_at FROM facturas WHERE id = ?) "
+                     "WHERE id = ?", (b, a))
+        db.tocar_version(conn)
+    j = _cambios(client, j["cursor"])
+    assert [f["id"] for f in j["upserts"]] == [a]
+    assert _cambios(client, j["cursor"])["upserts"] == []
+
+
+def test_paginas_y_borrados(client):
+    cursor = client.get("/facturas/changes").get_json()["cursor"]
+    ids = [_crear(client, f"C{i}") for i in range(5)]
+    client.delete(f"/facturas/{ids[1]}")
+    client.put(f"/facturas/{ids[0]}", json={"monto": 99})
+
+    upserts, deletes, mas = [], [], True
+    while mas:
+        j = client.get(f"/facturas/changes?since={cursor}&limit=2").get_json()
+        upserts += [f["id"] for f in j["upserts"]]
+        deletes += j["deletes"]
+        cursor, mas = j["cursor"], j["mas"]
+    # una marca por factura: la última (ids[0] al final por su cambio)
+    assert upserts == [ids[2], ids[3], ids[4], ids[0]]
+    assert deletes == [ids[1]]
+
+
+def test_cursor_vencido_410(client):
+    _crear(client, "A")
+    cursor = client.get("/facturas/changes").get_json()["cursor"]
+    _crear(client, "B")
+    with db.get_conn() as conn:
+        conn.execute("UPDATE facturas_cambios_poda SET seq = ? WHERE id = 1", (int(cursor) + 1,))
+        db.tocar_version(conn)
+    try:
+        assert client.get(f"/facturas/changes?since={cursor}").status_code == 410
+        assert client.get("/facturas/changes?since=2026-01-01 00:00:00.000,5").status_code == 410
+        assert client.get("/facturas/changes?since=0").status_code == 200
+    finally:
+        with db.get_conn() as conn:
+            conn.execute("UPDATE facturas_cambios_poda SET seq = 0 WHERE id = 1")
+            conn.commit()
@@ -0,0 +1,72 @@
+import random
+
+import db
+
+CLIENTES = ["Ana", "Beto", "Carla", "Dani"]
+ESTADOS = ["pendiente", "pagada", "vencida"]
+
+
+def _fecha(rnd):
+    return f"2026-{rnd.randint(1, 4):02d}-{rnd.randint(1, 28):02d}"
+
+
+def _tablas(conn):
+    clientes = {
+        r["cliente"]: (r["total_facturas"], r["abiertas"], round(r["saldo"], 2), r["vence_mas_antigua"])
+        for r in conn.execute("SELECT * FROM clientes")
+    }
+    resumen = {
+        r["mes"]: (r["total_facturas"], round(r["monto_total"], 2), r["pendientes"])
+        for r in conn.execute("SELECT * FROM resumen_mensual WHERE total_facturas <> 0")
+    }
+    return clientes, resumen
+
+
+def _recalculo(conn):
+    # mismas consultas que llenan las tablas al crearlas
+    clientes = {
+        r[0]: (r[1], r[2], round(r[3], 2), r[4])
+        for r in conn.execute("""
+            SELECT cliente, count(*), sum(estado <> 'pagada'),
+                   coalesce(sum(CASE WHEN estado <> 'pagada' THEN monto END), 0),
+                   min(CASE WHEN estado <> 'pagada' THEN vence END)
+            FROM facturas GROUP BY cliente""")
+    }
+    resumen = {
+        r[0]: (r[1], round(r[2], 2), r[3])
+        for r in conn.execute("""
+            SELECT substr(vence, 1, 7), count(*), sum(monto), sum(estado = 'pendiente')
+            FROM facturas GROUP BY substr(vence, 1, 7)""")
+    }
+    return clientes, resumen
+
+
+def test_tablas_derivadas_igual_a_recalculo(client):
+    rnd = random.Random(18)
+    ids = []
+    for paso in range(300):
+        op = rnd.random()
+        if op < 0.35 or not ids:
+            r = client.post("/facturas", json={
+                "cliente": rnd.choice(CLIENTES), "monto": rnd.randint(1, 500) / 4,
+                "vence": _fecha(rnd), "estado": rnd.choice(ESTADOS),
+            })
+            assert r.status_code == 201
+            ids.append(r.get_json()["id"])
+        elif op < 0.6:
+            cambios = {k: v for k, v in (
+                ("cliente", rnd.choice(CLIENTES)), ("monto", rnd.randint(1, 500) / 4),
+                ("vence", _fecha(rnd)), ("estado", rnd.choice(ESTADOS)),
+            ) if rnd.random() < 0.5} or {"estado": rnd.choice(ESTADOS)}
+            assert client.put(f"/facturas/{rnd.choice(ids)}", json=cambios).status_code == 200
+        elif op < 0.8:
+            lote = rnd.sample(ids, min(len(ids), rnd.randint(1, 8)))
+            cambios = rnd.choice([{"estado": rnd.choice(ESTADOS)}, {"vence": _fecha(rnd)}, {"cliente": rnd.choice(CLIENTES)}])
+            assert client.patch("/facturas", json={"ids": lote, "cambios": cambios}).status_code == 200
+        else:
+            fid = ids.pop(rnd.randrange(len(ids)))
+            assert client.delete(f"/facturas/{fid}").status_code in (200, 204)
+
+        if paso % 50 == 49:
+            with db.get_conn() as conn:
+                assert _tablas(conn) == _recalculo(conn), f"paso {paso}"
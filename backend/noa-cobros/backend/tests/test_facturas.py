@@ -0,0 +1,48 @@
+import pytest
+
+import db
+
+
+def _paginas(client, url):
+    ids, after = [], None
+    while True:
+        r = client.get(url + (f"&after={after}" if after else ""))
+        assert r.status_code == 200
+        ids += [f["id"] for f in r.get_json()]
+        after = r.headers.get("X-Next-Cursor")
+        if not after:
+            return ids
+
+
+@pytest.mark.parametrize("orden", ["", "&orden=relevancia"])
+def test_busqueda_paginada_completa(client, subir, orden):
+    if not db.FTS_DISPONIBLE:
+        pytest.skip("sqlite sin FTS5")
+    # nombres de distinto largo para que el rank no siga el orden por (vence, id)
+    filas = [f"{'Pérez ' * (1 + i % 4)}{i},{i + 1},2026-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in range(97)]
+    subir("cliente,monto,vence\n" + "\n".join(filas + ["Otro,5,2026-01-01"]) + "\n")
+
+    todas = [f["id"] for f in client.get(f"/facturas?q=perez{orden}").get_json()]
+    ids = _paginas(client, f"/facturas?q=perez&limit=10{orden}")
+    assert len(todas) == 97
+    assert len(ids) == len(set(ids))
+    assert ids == todas
+
+
+@pytest.mark.parametrize("cuerpo", [
+    [1, 2],
+    "pagada",
+    {"ids": [1], "cambios": ["estado", "pagada"]},
+    {"ids": [1], "cambios": "pagada"},
+    {"filtro": ["estado"], "cambios": {"estado": "pagada"}},
+])
+def test_patch_cuerpo_invalido_es_400(client, cuerpo):
+    r = client.patch("/facturas", json=cuerpo)
+    assert r.status_code == 400
+    assert "error" in r.get_json()
+
+
+def test_put_cuerpo_no_objeto_es_400(client, subir):
+    subir("cliente,monto,vence\nAna,1,2026-01-01\n")
+    fid = client.get("/facturas").get_json()[0]["id"]
+    assert client.put(f"/facturas/{fid}", json="cliente").status_code == 400
@@ -0,0 +1,15 @@
+def test_reporte_detalle_paginado(client, subir):
+    subir("cliente,monto,vence\n" + "".join(f"K{i},{i + 1},2026-03-{1 + i % 28:02d}\n" for i in range(7)))
+    r = client.get("/reporte/mensual?mes=2026-03&detalle=1&limit=3").get_json()
+    assert r["resumen"]["total_facturas"] == 7
+    ids = [f["id"] for f in r["facturas"]]
+    while r["next"]:
+        r = client.get(f"/reporte/mensual?mes=2026-03&detalle=1&limit=3&after={r['next']}").get_json()
+        ids += [f["id"] for f in r["facturas"]]
+    assert len(ids) == len(set(ids)) == 7
+
+
+def test_reporte_after_invalido(client):
+    for after in ("bad", "2026-03-01,x"):
+        r = client.get(f"/reporte/mensual?mes=2026-03&detalle=1&after={after}")
+        assert r.status_code == 400
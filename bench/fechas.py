@@ -0,0 +1,64 @@
+"""
+Benchmark: _to_date fila por fila (versión original) vs fechas.a_fechas.
+
+    python -m bench.fechas [filas]
+"""
+import sys
+import time
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+from fechas import a_fechas
+
+
+def _to_date_original(val):
+    if pd.isna(val):
+        return None
+    if isinstance(val, (datetime, date, pd.Timestamp)):
+        return pd.Timestamp(val).date()
+    s = str(val).strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except Exception:
+            pass
+    return None
+
+
+def columna_vence(n: int, seed: int = 7) -> pd.Series:
+    """Mezcla de formatos como la que llega de distintos ERP."""
+    rng = np.random.default_rng(seed)
+    dias = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D")
+    fmt = rng.integers(0, 4, n)
+    iso = dias.strftime("%Y-%m-%d")
+    dmy = dias.strftime("%d/%m/%Y")
+    dmy_guion = dias.strftime("%d-%m-%Y")
+    mdy = dias.strftime("%m/%d/%Y")
+    valores = np.select([fmt == 0, fmt == 1, fmt == 2], [iso, dmy, dmy_guion], mdy)
+    return pd.Series(valores, dtype=object)
+
+
+def _medir(fn, serie):
+    t0 = time.perf_counter()
+    out = fn(serie)
+    return time.perf_counter() - t0, out
+
+
+def main(n: int = 1_000_000):
+    serie = columna_vence(n)
+
+    t_orig, esperado = _medir(lambda s: s.apply(_to_date_original), serie)
+    t_vec, obtenido = _medir(a_fechas, serie)
+
+    iguales = bool((esperado.astype(object).values == obtenido.values).all())
+    print(f"filas:        {n:,}")
+    print(f"_to_date:     {t_orig:8.2f} s")
+    print(f"a_fechas:     {t_vec:8.2f} s")
+    print(f"aceleración:  {t_orig / t_vec:8.1f}x")
+    print(f"resultados iguales: {iguales}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
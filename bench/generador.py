@@ -0,0 +1,82 @@
+"""
+Generador reproducible de facturas sintéticas (CSV/XLSX).
+
+    python -m bench.generador 100000 facturas_100k.csv [--seed 7] [--sin-telefono]
+"""
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+PREFIJOS = ["Distribuidora", "Comercial", "Inversiones", "Servicios", "Ferretería", "Farmacia", "Soda", "Taller"]
+NOMBRES = ["Pérez", "Solís", "Mora", "Jiménez", "Rojas", "Vargas", "Castro", "Araya", "Chaves", "Quesada",
+           "Alfaro", "Ulate", "Núñez", "Brenes", "Zúñiga", "Campos", "Ramírez", "Calderón", "Villalobos", "Segura"]
+
+
+def generar(n: int, seed: int = 7, hoy: date = None, telefono: bool = True) -> pd.DataFrame:
+    """
+    n facturas con distribuciones parecidas a un reporte de antigüedad real:
+    - ~n/20 clientes; un 30% de las facturas se concentra en pocos (Zipf)
+    - montos lognormales redondeados a ₡100
+    - vencimientos entre 180 días atrás y 120 adelante
+    - teléfonos CR en varios formatos y ~10% vacíos
+    """
+    rng = np.random.default_rng(seed)
+    hoy = pd.Timestamp(hoy or date.today())
+
+    n_clientes = max(1, n // 20)
+    catalogo = np.array([
+        f"{PREFIJOS[i % len(PREFIJOS)]} {NOMBRES[(i // len(PREFIJOS)) % len(NOMBRES)]} {i}"
+        for i in range(n_clientes)
+    ], dtype=object)
+    idx_cliente = np.where(
+        rng.random(n) < 0.3,
+        (rng.zipf(1.5, n) - 1) % n_clientes,
+        rng.integers(0, n_clientes, n),
+    )
+
+    df = pd.DataFrame({
+        "cliente": catalogo[idx_cliente],
+        "monto": (rng.lognormal(11.5, 1.0, n) / 100).round() * 100,
+        "vence": (hoy + pd.to_timedelta(rng.integers(-180, 121, n), unit="D")).strftime("%Y-%m-%d"),
+    })
+
+    if telefono:
+        # mismo teléfono para todas las facturas de un cliente
+        numeros = pd.Series(rng.integers(60_000_000, 90_000_000, n_clientes).astype(str))
+        variantes = np.stack([
+            numeros,
+            numeros.str[:4] + "-" + numeros.str[4:],
+            "506 " + numeros.str[:4] + " " + numeros.str[4:],
+            "+506" + numeros,
+        ], axis=1)
+        tels = variantes[np.arange(n_clientes), rng.integers(0, 4, n_clientes)]
+        tels[rng.random(n_clientes) < 0.10] = ""
+        df["telefono"] = tels[idx_cliente]
+
+    return df
+
+
+def escribir(df: pd.DataFrame, path: str) -> str:
+    if path.lower().endswith(".xlsx"):
+        df.to_excel(path, index=False, engine="openpyxl")
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera facturas sintéticas")
+    parser.add_argument("filas", type=int)
+    parser.add_argument("salida", help="archivo .csv o .xlsx")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--sin-telefono", action="store_true")
+    args = parser.parse_args()
+
+    df = generar(args.filas, args.seed, telefono=not args.sin_telefono)
+    print(escribir(df, args.salida))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: _compose_message por factura (versión original) vs
+Plantilla.render_lote sobre columnas, y el resumen por teléfono de
+/notificar (app._mensajes_por_telefono) sobre las mismas filas.
+
+    python -m bench.plantillas [mensajes]
+
+Falla (AssertionError) si agrupar por teléfono cuesta más de
+MAX_FACTOR_AGRUPADO veces render_lote.
+"""
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from plantillas import plantilla_para
+
+# agrupar y resumir no debe costar mucho más que un mensaje por factura; con
+# un formateo de pandas por teléfono llegó a ~100x, el margen cubre el ruido
+MAX_FACTOR_AGRUPADO = 8
+# facturas por teléfono en promedio (100k filas -> ~4.5k teléfonos)
+FACTURAS_POR_TELEFONO = 22
+
+
+def _compose_message_original(cliente: str, monto: float, vence: date) -> str:
+    tpl = os.getenv(
+        "WASENDER_MSG_TEMPLATE",
+        "Estimado {cliente}, le recordamos su factura por ₡{monto} que vence el {vence}. – {firma}",
+    )
+    firma = os.getenv("PLANTILLA_FIRMA", "Noa Cobros")
+    return tpl.format(
+        cliente=cliente,
+        monto=f"{monto:,.0f}".replace(",", "."),
+        vence=pd.Timestamp(vence).date().strftime("%d/%m/%Y"),
+        firma=firma,
+    )
+
+
+def _medir(fn, repeticiones: int = 3):
+    """Mejor de 'repeticiones' corridas, como timeit."""
+    mejor, out = None, None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        out = fn()
+        t = time.perf_counter() - t0
+        mejor = t if mejor is None else min(mejor, t)
+    return mejor, out
+
+
+def main(n: int = 50_000, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    clientes = [f"Cliente {i}" for i in rng.integers(0, 5000, n)]
+    montos = rng.lognormal(11, 1, n).round(2).tolist()
+    vences = (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D")).date.tolist()
+
+    t_orig, esperado = _medir(lambda: [_compose_message_original(c, m, v) for c, m, v in zip(clientes, montos, vences)])
+    plantilla = plantilla_para("proximas")
+    t_lote, obtenido = _medir(lambda: plantilla.render_lote(clientes, montos, vences))
+
+    print(f"mensajes:          {n:,}")
+    print(f"_compose_message:  {t_orig:8.3f} s")
+    print(f"render_lote:       {t_lote:8.3f} s")
+    print(f"aceleración:       {t_orig / t_lote:8.1f}x")
+    print(f"resultados iguales: {esperado == obtenido}")
+
+    # resumen por teléfono: filas ordenadas por vence como las entrega la consulta
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from app import FilaCandidata, _mensajes_por_telefono
+
+    telefonos = [f"+5068{t:07d}" for t in rng.integers(0, max(1, n // FACTURAS_POR_TELEFONO), n)]
+    orden = np.argsort(np.array(vences, dtype="datetime64[D]"), kind="stable")
+    filas = [FilaCandidata(int(i), clientes[i], montos[i], vences[i], telefonos[i]) for i in orden]
+    t_agrupado, grupos = _medir(lambda: list(_mensajes_por_telefono(filas, "proximas")))
+
+    print(f"por teléfono:      {t_agrupado:8.3f} s  ({len(grupos):,} mensajes)")
+    print(f"vs render_lote:    {t_agrupado / t_lote:8.1f}x")
+    assert t_agrupado <= MAX_FACTOR_AGRUPADO * t_lote, (
+        f"_mensajes_por_telefono tardó {t_agrupado:.3f} s, más de {MAX_FACTOR_AGRUPADO}x render_lote ({t_lote:.3f} s)"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
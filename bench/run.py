@@ -0,0 +1,227 @@
+"""
+Benchmark de endpoints con el test client de Flask.
+
+Mide throughput, latencia p50/p99 y RSS máximo de:
+  upload        POST /upload-file              (app.py)
+  listar        GET /facturas?limit=1000       (app.py)
+  listar_cache  GET /facturas?limit=1000       (app.py, servido desde la caché)
+  listar_todo   GET /facturas?format=ndjson    (app.py)
+  notificar     POST /notificar?dry_run=1      (app.py)
+  reporte       GET /reporte/mensual           (backend sqlite)
+  reporte_cache GET /reporte/mensual           (backend sqlite, servido desde la caché)
+
+'listar' y 'reporte' vacían la caché de respuestas (cache_http) antes de
+cada repetición, así miden la consulta; las variantes '_cache' miden aciertos.
+
+Cada medición corre en un proceso aparte para que el RSS sea el del endpoint.
+
+    python -m bench.run --filas 10000,100000 --salida bench/baseline.json
+    python -m bench.run --filas 10000 --comparar bench/baseline.json --umbral 0.2
+    python -m bench.run --postgres postgresql://localhost/bench   # base descartable
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench.generador import generar, escribir
+
+RAIZ = Path(__file__).resolve().parent.parent
+BACKEND_SQLITE = RAIZ / "backend" / "noa-cobros" / "backend"
+
+ENDPOINTS = ["upload", "listar", "listar_cache", "listar_todo", "notificar", "reporte", "reporte_cache"]
+REPETICIONES = {"upload": 1, "listar": 50, "listar_cache": 50, "listar_todo": 3, "notificar": 5,
+                "reporte": 50, "reporte_cache": 50}
+
+
+# ---------------------------
+# Proceso hijo: una medición
+# ---------------------------
+def _rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _app_principal(db_url: str, limpiar: bool):
+    os.environ["DATABASE_URL"] = db_url
+    sys.path.insert(0, str(RAIZ))
+    import app
+    if limpiar:
+        app.metadata.drop_all(app.engine)
+        app.metadata.create_all(app.engine)
+    return app
+
+
+def _app_sqlite(db_path: str):
+    sys.path.insert(0, str(BACKEND_SQLITE))
+    import db
+    db.DB_PATH = Path(db_path)
+    spec = importlib.util.spec_from_file_location("noa_sqlite_app", BACKEND_SQLITE / "app.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _medir(peticion, repeticiones: int, antes=None):
+    latencias = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        t0 = time.perf_counter()
+        r = peticion()
+        r.get_data()  # consume respuestas en streaming
+        latencias.append(time.perf_counter() - t0)
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code}: {r.get_data(as_text=True)[:300]}")
+    return latencias
+
+
+def medir_uno(endpoint: str, filas: int, db_url: str, archivo: str, sqlite_path: str) -> dict:
+    """Corre un endpoint y devuelve sus métricas (se ejecuta en el proceso hijo)."""
+    rep = REPETICIONES[endpoint]
+
+    if endpoint.startswith("reporte"):
+        client = _app_sqlite(sqlite_path).app.test_client()
+        peticion = lambda: client.get("/reporte/mensual")
+    else:
+        client = _app_principal(db_url, limpiar=(endpoint == "upload")).app.test_client()
+        if endpoint == "upload":
+            peticion = lambda: client.post("/upload-file", data={"file": (open(archivo, "rb"), Path(archivo).name)})
+        elif endpoint in ("listar", "listar_cache"):
+            peticion = lambda: client.get("/facturas?limit=1000")
+        elif endpoint == "listar_todo":
+            peticion = lambda: client.get("/facturas?format=ndjson")
+        else:
+            peticion = lambda: client.post("/notificar?dry_run=1&modo=todas")
+
+    # el módulo que cargó la app medida (raíz o backend sqlite)
+    import cache_http
+    antes = cache_http.cache.limpiar if endpoint in ("listar", "reporte") else None
+    if endpoint.endswith("_cache"):
+        peticion().get_data()  # la primera respuesta llena la caché
+    latencias = _medir(peticion, rep, antes)
+    unidades = filas if endpoint in ("upload", "listar_todo") else 1
+    return {
+        "throughput": round(unidades * rep / sum(latencias), 2),
+        "unidad": "filas/s" if unidades > 1 else "req/s",
+        "p50_ms": round(float(np.percentile(latencias, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencias, 99)) * 1000, 2),
+        "rss_mb": round(_rss_mb(), 1),
+    }
+
+
+# ---------------------------
+# Proceso padre: orquestación
+# ---------------------------
+def _en_subproceso(**kw) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.run", "--_uno", json.dumps(kw)],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "falló el subproceso")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _poblar_sqlite(path: str, archivo_sin_tel: str):
+    """Carga el backend sqlite (para /reporte/mensual) vía POST /facturas/csv."""
+    client = _app_sqlite(path).app.test_client()
+    r = client.post("/facturas/csv", data={"file": (open(archivo_sin_tel, "rb"), "facturas.csv")})
+    if r.status_code >= 400:
+        raise RuntimeError(r.get_data(as_text=True))
+
+
+def correr(filas_lista, postgres=None, seed: int = 7) -> dict:
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for filas in filas_lista:
+            df = generar(filas, seed)
+            archivo = escribir(df, os.path.join(tmp, f"facturas_{filas}.csv"))
+            sin_tel = escribir(df.drop(columns=["telefono"]), os.path.join(tmp, f"facturas_{filas}_3col.csv"))
+
+            sqlite_path = os.path.join(tmp, f"noa_{filas}.db")
+            subprocess.run(
+                [sys.executable, "-c", f"from bench.run import _poblar_sqlite; _poblar_sqlite({sqlite_path!r}, {sin_tel!r})"],
+                cwd=RAIZ, check=True,
+            )
+
+            destinos = {"sqlite": f"sqlite:///{os.path.join(tmp, f'facturas_{filas}.db')}"}
+            if postgres:
+                destinos["postgres"] = postgres
+
+            for nombre, db_url in destinos.items():
+                for endpoint in ENDPOINTS:
+                    if endpoint.startswith("reporte") and nombre != "sqlite":
+                        continue
+                    clave = f"{nombre}/{filas}/{endpoint}"
+                    resultados[clave] = _en_subproceso(
+                        endpoint=endpoint, filas=filas, db_url=db_url, archivo=archivo, sqlite_path=sqlite_path,
+                    )
+                    r = resultados[clave]
+                    print(f"{clave:32} {r['throughput']:>12,.1f} {r['unidad']:8} p50={r['p50_ms']:>9.2f}ms "
+                          f"p99={r['p99_ms']:>9.2f}ms rss={r['rss_mb']:>7.1f}MB", flush=True)
+
+    return {
+        "meta": {"python": platform.python_version(), "plataforma": platform.platform(), "seed": seed},
+        "resultados": resultados,
+    }
+
+
+def comparar(actual: dict, base: dict, umbral: float) -> list:
+    """Lista de regresiones: throughput menor, o p99/RSS mayor, más allá del umbral."""
+    regresiones = []
+    for clave, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(clave)
+        if not b:
+            continue
+        if r["throughput"] < b["throughput"] * (1 - umbral):
+            regresiones.append(f"{clave}: throughput {r['throughput']} < {b['throughput']}")
+        if r["p99_ms"] > b["p99_ms"] * (1 + umbral):
+            regresiones.append(f"{clave}: p99 {r['p99_ms']}ms > {b['p99_ms']}ms")
+        if r["rss_mb"] > b["rss_mb"] * (1 + umbral):
+            regresiones.append(f"{clave}: rss {r['rss_mb']}MB > {b['rss_mb']}MB")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints de Noa Cobros")
+    parser.add_argument("--filas", default="10000,100000", help="tamaños separados por coma (ej. 10000,100000,1000000)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--postgres", default=os.getenv("BENCH_POSTGRES_URL"), help="URL de una base Postgres DESCARTABLE")
+    parser.add_argument("--salida", help="guarda los resultados como baseline JSON")
+    parser.add_argument("--comparar", help="baseline JSON contra el que comparar")
+    parser.add_argument("--umbral", type=float, default=0.2, help="tolerancia relativa (0.2 = 20%%)")
+    parser.add_argument("--_uno", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._uno:
+        print(json.dumps(medir_uno(**json.loads(args._uno))))
+        return
+
+    res = correr([int(x) for x in args.filas.split(",")], args.postgres, args.seed)
+
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(res, indent=2, ensure_ascii=False))
+        print(f"baseline guardado en {args.salida}")
+
+    if args.comparar:
+        regresiones = comparar(res, json.loads(Path(args.comparar).read_text()), args.umbral)
+        for r in regresiones:
+            print(f"REGRESIÓN {r}")
+        if regresiones:
+            sys.exit(1)
+        print("sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
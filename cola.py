@@ -0,0 +1,166 @@
+import uuid
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+# ---------------------------
+# Cola persistente de notificaciones (outbox)
+# ---------------------------
+# estados: pendiente -> enviando -> enviado | error (tras MAX_INTENTOS)
+MAX_INTENTOS = 3
+BACKOFF_SEG = 30
+# un envío 'enviando' más viejo que esto se considera abandonado (worker caído)
+LEASE = timedelta(minutes=10)
+
+
+def definir_tabla(metadata):
+    tabla = sa.Table(
+        "notificaciones", metadata,
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("job_id", sa.String(32), nullable=False),
+        sa.Column("factura_id", sa.Integer, nullable=True),
+        # mensaje consolidado por teléfono: ids de todas las facturas que cubre
+        sa.Column("facturas", sa.Text, nullable=True),
+        sa.Column("n_facturas", sa.Integer, nullable=False, default=1),
+        sa.Column("cliente", sa.String(255), nullable=True),
+        sa.Column("telefono", sa.String(32), nullable=False),
+        sa.Column("mensaje", sa.Text, nullable=False),
+        sa.Column("estado", sa.String(16), nullable=False, default="pendiente"),
+        sa.Column("intentos", sa.Integer, nullable=False, default=0),
+        sa.Column("respuesta", sa.Text, nullable=True),
+        sa.Column("proximo_intento", sa.DateTime, nullable=False),
+        sa.Column("creado", sa.DateTime, nullable=False),
+        sa.Column("actualizado", sa.DateTime, nullable=False),
+    )
+    sa.Index("ix_notificaciones_job_estado", tabla.c.job_id, tabla.c.estado)
+    sa.Index("ix_notificaciones_estado_proximo", tabla.c.estado, tabla.c.proximo_intento)
+    return tabla
+
+
+def encolar(conn, tabla, items, batch_size: int = 5000) -> dict:
+    """
+    Guarda los mensajes [{factura_id, facturas, n_facturas, cliente, telefono, mensaje}, ...] como un
+    job nuevo dentro de la transacción de 'conn' y devuelve su id (None si no
+    había nada que encolar). No envía
+    nada: eso lo hace el worker. 'items' puede ser un generador; se escribe
+    en lotes de 'batch_size' para no materializarlo entero.
+    """
+    job_id = uuid.uuid4().hex
+    ahora = datetime.utcnow()
+    encolados, n_facturas, filas = 0, 0, []
+    for it in items:
+        it.setdefault("facturas", None)
+        it.setdefault("n_facturas", 1)
+        n_facturas += it["n_facturas"]
+        filas.append({**it, "job_id": job_id, "estado": "pendiente", "intentos": 0,
+                      "proximo_intento": ahora, "creado": ahora, "actualizado": ahora})
+        if len(filas) >= batch_size:
+            conn.execute(tabla.insert(), filas)
+            encolados += len(filas)
+            filas = []
+    if filas:
+        conn.execute(tabla.insert(), filas)
+        encolados += len(filas)
+    if not encolados:
+        # sin filas el job no existiría para progreso(): no se anuncia
+        job_id = None
+    return {"job_id": job_id, "encolados": encolados, "facturas": n_facturas}
+
+
+def _reclamar(engine, tabla, batch_size):
+    ahora = datetime.utcnow()
+    c = tabla.c
+    with engine.begin() as conn:
+        conn.execute(
+            tabla.update()
+            .where(c.estado == "enviando", c.actualizado < ahora - LEASE)
+            .values(estado="pendiente", actualizado=ahora)
+        )
+        filas = conn.execute(
+            sa.select(c.id, c.telefono, c.mensaje, c.intentos)
+            .where(c.estado == "pendiente", c.proximo_intento <= ahora)
+            .order_by(c.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if filas:
+            conn.execute(
+                tabla.update()
+                .where(c.id.in_([f.id for f in filas]))
+                .values(estado="enviando", actualizado=ahora)
+            )
+    return filas
+
+
+def procesar_lote(engine, tabla, despachador, batch_size: int = 100) -> int:
+    """Reclama hasta 'batch_size' mensajes, los envía y guarda el estado de cada uno."""
+    filas = _reclamar(engine, tabla, batch_size)
+    if not filas:
+        return 0
+
+    respuestas = despachador.enviar_lote((f.telefono, f.mensaje) for f in filas)
+
+    ahora = datetime.utcnow()
+    cambios = []
+    for f, resp in zip(filas, respuestas):
+        intentos = f.intentos + 1
+        if resp.get("ok"):
+            estado = "enviado"
+        elif intentos < MAX_INTENTOS:
+            estado = "pendiente"
+        else:
+            estado = "error"
+        cambios.append({
+            "b_id": f.id,
+            "estado": estado,
+            "intentos": intentos,
+            "respuesta": str(resp.get("resp") or resp.get("error") or resp.get("status") or "")[:400],
+            "proximo_intento": ahora + timedelta(seconds=BACKOFF_SEG * 2 ** (intentos - 1)),
+            "actualizado": ahora,
+        })
+
+    with engine.begin() as conn:
+        conn.execute(tabla.update().where(tabla.c.id == sa.bindparam("b_id")), cambios)
+    return len(filas)
+
+
+def progreso(engine, tabla, job_id: str):
+    """Conteo por estado de un job (mensajes y facturas que cubren), o None si no existe."""
+    c = tabla.c
+    with engine.begin() as conn:
+        conteo = {
+            estado: (n, f) for estado, n, f in conn.execute(
+                sa.select(c.estado, sa.func.count(), sa.func.sum(c.n_facturas))
+                .where(c.job_id == job_id).group_by(c.estado)
+            ).all()
+        }
+        if not conteo:
+            return None
+        fallidos = conn.execute(
+            sa.select(c.factura_id, c.facturas, c.telefono, c.respuesta)
+            .where(c.job_id == job_id, c.estado == "error")
+            .order_by(c.id)
+            .limit(20)
+        ).all()
+
+    total = sum(n for n, _ in conteo.values())
+    enviados = conteo.get("enviado", (0, 0))[0]
+    errores = conteo.get("error", (0, 0))[0]
+    return {
+        "job_id": job_id,
+        "total": total,
+        "enviados": enviados,
+        "errores": errores,
+        "pendientes": total - enviados - errores,
+        "terminado": enviados + errores == total,
+        "facturas": {
+            "total": sum(int(f or 0) for _, f in conteo.values()),
+            "notificadas": int(conteo.get("enviado", (0, 0))[1] or 0),
+            "con_error": int(conteo.get("error", (0, 0))[1] or 0),
+        },
+        "fallidos": [
+            {"facturas": [int(x) for x in f.facturas.split(",")] if f.facturas else [f.factura_id],
+             "telefono": f.telefono, "respuesta": f.respuesta}
+            for f in fallidos
+        ],
+    }
@@ -0,0 +1,3 @@
+# backend/noa-cobros/backend es otra app (sus propios módulos app, db, cache_http):
+# sus pruebas se corren desde esa carpeta.
+collect_ignore = ["backend"]
@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metricas
+
+# ---------------------------
+# Envío de WhatsApp (Wasender)
+# ---------------------------
+DEFAULT_URL = "https://api.wasenderapi.com/send-message"
+
+
+class TokenBucket:
+    """Limita a 'rate' envíos por segundo con ráfagas de hasta 'capacity'."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.rate
+            time.sleep(espera)
+
+
+class Despachador:
+    """
+    Envía mensajes con una sesión HTTP persistente (keep-alive) compartida por
+    un pool acotado de hilos, respetando el límite de la cuota de Wasender.
+    """
+
+    def __init__(self, url: str = DEFAULT_URL, api_key: str = "", workers: int = 8,
+                 rate: float = 5.0, burst: int = 5, timeout: float = 15):
+        self.url = url
+        self.api_key = api_key
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            url=os.getenv("WASENDER_URL", DEFAULT_URL),
+            api_key=os.getenv("WASENDER_API_KEY", ""),
+            workers=int(os.getenv("WASENDER_WORKERS", 8)),
+            rate=float(os.getenv("WASENDER_RATE", 5)),
+            burst=int(os.getenv("WASENDER_BURST", 5)),
+            timeout=float(os.getenv("WASENDER_TIMEOUT", 15)),
+        )
+
+    def enviar(self, phone: str, message: str) -> dict:
+        if not self.api_key:
+            return {"ok": False, "error": "Falta WASENDER_API_KEY"}
+
+        self.bucket.acquire()
+        t0 = time.perf_counter()
+        try:
+            r = self.session.post(self.url, json={"api_key": self.api_key, "phone": phone, "message": message}, timeout=self.timeout)
+            metricas.wasender_respuestas.inc(status=r.status_code)
+            return {"ok": 200 <= r.status_code < 300, "status": r.status_code, "resp": (r.text[:300] if r.text else "")}
+        except Exception as e:
+            metricas.wasender_respuestas.inc(status="error")
+            return {"ok": False, "error": str(e)}
+        finally:
+            metricas.wasender_latencia.observe(time.perf_counter() - t0)
+
+    def enviar_lote(self, mensajes) -> list:
+        """Envía [(phone, message), ...] en paralelo; las respuestas conservan el orden."""
+        mensajes = list(mensajes)
+        if not mensajes:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(mensajes))) as pool:
+            return list(pool.map(lambda m: self.enviar(*m), mensajes))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_despachador = None
+_despachador_lock = threading.Lock()
+
+
+def get_despachador() -> Despachador:
+    """Despachador compartido por el proceso (una sesión/pool por worker)."""
+    global _despachador
+    with _despachador_lock:
+        if _despachador is None:
+            _despachador = Despachador.desde_entorno()
+        return _despachador
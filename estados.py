@@ -0,0 +1,85 @@
+"""
+Transición incremental de estado: pendiente -> vencida.
+
+Solo toca las facturas cuyo 'vence' cayó entre la última corrida (marca de
+agua guardada en 'meta') y hoy, usando el índice (estado, vence).
+
+    python estados.py
+"""
+import time
+from datetime import datetime, date
+
+import sqlalchemy as sa
+
+MARCA = "estados_vencidas_hasta"
+# contador que sube con cada escritura a 'facturas' (ETag de GET /facturas)
+VERSION = "version_facturas"
+
+
+def definir_meta(metadata):
+    """Tabla clave/valor para marcas de agua y contadores internos."""
+    return sa.Table(
+        "meta", metadata,
+        sa.Column("clave", sa.String(64), primary_key=True),
+        sa.Column("valor", sa.String(255), nullable=False),
+    )
+
+
+def leer_meta(conn, meta, clave):
+    return conn.execute(sa.select(meta.c.valor).where(meta.c.clave == clave)).scalar_one_or_none()
+
+
+def guardar_meta(conn, meta, clave, valor) -> None:
+    n = conn.execute(meta.update().where(meta.c.clave == clave).values(valor=str(valor))).rowcount
+    if not n:
+        conn.execute(meta.insert().values(clave=clave, valor=str(valor)))
+
+
+def version_facturas(conn, meta) -> str:
+    return leer_meta(conn, meta, VERSION) or "0"
+
+
+def tocar_version(conn, meta) -> None:
+    """
+    Sube la versión guardada en 'meta', en la misma transacción que escribe.
+    Si la clave falta (base nueva, reset_db.py) se crea con la hora en ms y no
+    con 0: un navegador con un ETag de la base anterior no recibe un 304.
+    """
+    n = conn.execute(
+        meta.update().where(meta.c.clave == VERSION)
+        .values(valor=sa.cast(sa.cast(meta.c.valor, sa.BigInteger) + 1, sa.String))
+    ).rowcount
+    if not n:
+        conn.execute(meta.insert().values(clave=VERSION, valor=str(int(time.time() * 1000))))
+
+
+def actualizar_vencidas(engine, facturas, meta, hoy: date = None) -> dict:
+    """Marca como 'vencida' lo pendiente con vence en [marca, hoy) y avanza la marca."""
+    hoy = hoy or datetime.utcnow().date()
+    c = facturas.c
+    with engine.begin() as conn:
+        desde = leer_meta(conn, meta, MARCA)
+        desde = date.fromisoformat(desde) if desde else None
+        if desde is not None and desde >= hoy:
+            return {"desde": desde.isoformat(), "hasta": hoy.isoformat(), "actualizadas": 0}
+
+        cond = [c.estado == "pendiente", c.vence < hoy]
+        if desde is not None:
+            cond.append(c.vence >= desde)
+        n = conn.execute(facturas.update().where(*cond).values(estado="vencida")).rowcount
+        guardar_meta(conn, meta, MARCA, hoy.isoformat())
+        if n:
+            tocar_version(conn, meta)
+
+    return {"desde": desde.isoformat() if desde else None, "hasta": hoy.isoformat(), "actualizadas": n}
+
+
+def main():
+    from app import engine, facturas, meta
+
+    res = actualizar_vencidas(engine, facturas, meta)
+    print(f"{res['actualizadas']} facturas pasaron a 'vencida' (desde {res['desde']} hasta {res['hasta']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+
+# ---------------------------
+# Exportación (/facturas/export)
+# ---------------------------
+# Cada formato recibe los bloques de filas tal como salen del cursor
+# (Result.partitions) y produce bytes a medida que avanza: la memoria depende
+# del tamaño del bloque, no del total exportado.
+BLOQUE = int(os.getenv("EXPORT_BLOQUE", 5000))
+# trozos en que se sirve un archivo ya armado (xlsx)
+TROZO = 64 * 1024
+
+FORMATOS = {
+    "csv": ("text/csv", "csv"),  # Flask agrega "; charset=utf-8" a text/*
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _texto(v):
+    if v is None:
+        return ""
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def csv_stream(columnas, bloques):
+    """Encabezado y luego un trozo de CSV por bloque (con BOM para que Excel lea los acentos)."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(columnas)
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    for filas in bloques:
+        buf.seek(0)
+        buf.truncate()
+        w.writerows([_texto(v) for v in r] for r in filas)
+        yield buf.getvalue().encode("utf-8")
+
+
+def xlsx_stream(columnas, bloques):
+    """
+    Hoja en modo write-only (las filas van a un temporal, no a memoria). El
+    zip del .xlsx solo se puede cerrar al final, así que los bytes salen
+    recién después de la última fila.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("facturas")
+    ws.append(columnas)
+    for filas in bloques:
+        for r in filas:
+            ws.append(list(r))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            trozo = tmp.read(TROZO)
+            if not trozo:
+                break
+            yield trozo
+
+
+class _Tubo:
+    """Destino de escritura que acumula bytes hasta que el generador los saca."""
+
+    def __init__(self):
+        self._partes = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._pos += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def sacar(self) -> bytes:
+        datos, self._partes = b"".join(self._partes), []
+        return datos
+
+
+def parquet_disponible() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_stream(columnas, tipos, bloques):
+    """
+    Un row group por bloque; cada uno sale apenas se escribe y el pie del
+    archivo al final. 'tipos' es {columna: 'int'|'float'|'date'|'str'}.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pa_tipos = {"int": pa.int64(), "float": pa.float64(), "date": pa.date32(), "str": pa.string()}
+    esquema = pa.schema([(c, pa_tipos[tipos.get(c, "str")]) for c in columnas])
+    tubo = _Tubo()
+    writer = pq.ParquetWriter(tubo, esquema, compression="snappy")
+    try:
+        for filas in bloques:
+            if not filas:
+                continue
+            cols = list(zip(*filas))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(v, type=esquema.field(i).type) for i, v in enumerate(cols)], schema=esquema,
+            ), row_group_size=len(filas))
+            yield tubo.sacar()
+    finally:
+        writer.close()
+    yield tubo.sacar()
@@ -0,0 +1,70 @@
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Normalización de fechas
+# ---------------------------
+# Formatos completos, en orden de prioridad (el primero que calce gana).
+FORMATOS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y")
+# Fechas parciales sin año, como '26/08' en clientes.csv.
+FORMATOS_PARCIALES = ("%d/%m", "%d-%m")
+
+
+def _anio_actual() -> int:
+    return datetime.utcnow().year
+
+
+def _parse_unicos(valores: pd.Series, anio: int) -> pd.Series:
+    """Parsea una serie de strings únicos, un formato por pasada sobre lo pendiente."""
+    out = pd.Series(pd.NaT, index=valores.index, dtype="datetime64[ns]")
+    pendientes = valores
+
+    for fmt in FORMATOS:
+        if pendientes.empty:
+            break
+        parsed = pd.to_datetime(pendientes, format=fmt, errors="coerce")
+        ok = parsed.notna()
+        out[ok[ok].index] = parsed[ok]
+        pendientes = pendientes[~ok]
+
+    if not pendientes.empty:
+        for fmt in FORMATOS_PARCIALES:
+            if pendientes.empty:
+                break
+            sep = fmt[2]
+            parsed = pd.to_datetime(pendientes + f"{sep}{anio}", format=f"{fmt}{sep}%Y", errors="coerce")
+            ok = parsed.notna()
+            out[ok[ok].index] = parsed[ok]
+            pendientes = pendientes[~ok]
+
+    return out
+
+
+def a_fechas(serie: pd.Series, anio: int = None) -> pd.Series:
+    """
+    Normaliza una columna completa de fechas en cualquiera de FORMATOS.
+    Devuelve objetos date (o None) con el mismo índice que 'serie'.
+    Las fechas sin año ('26/08') toman 'anio' (por defecto, el año en curso).
+    Cada valor distinto se resuelve una sola vez y se reparte con factorize.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        out = serie.dt.date.astype(object)
+        return out.where(serie.notna(), None)
+
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    unicos = pd.Series(unicos, dtype=object)
+
+    es_fecha = unicos.map(lambda v: isinstance(v, (datetime, date))).astype(bool)
+    resueltas = pd.Series(pd.NaT, index=unicos.index, dtype="datetime64[ns]")
+    if es_fecha.any():
+        resueltas[es_fecha] = pd.to_datetime(unicos[es_fecha])
+    textos = unicos[~es_fecha].astype(str).str.strip()
+    if not textos.empty:
+        resueltas[textos.index] = _parse_unicos(textos, anio or _anio_actual())
+
+    tabla = resueltas.dt.date.astype(object).where(resueltas.notna(), None).to_numpy()
+    # el centinela -1 (NaN/None) apunta a un None agregado al final
+    tabla = np.append(tabla, None)
+    return pd.Series(tabla[codigos], index=serie.index, dtype=object)
@@ -13,22 +13,67 @@ async function ping(){
   }catch{ $("#status").textContent = "Sin conexión"; }
 }
 
+let etagFacturas = null;
+// cursor de GET /facturas/changes
+let cursorCambios = null;
+
 async function cargar(){
-  const r = await fetch(`${API_BASE}/facturas`);
+  // el cursor se toma antes de la carga completa: lo que cambie en el medio llega en la próxima sincronización
+  const c = await fetch(`${API_BASE}/facturas/changes`, {cache:"no-cache"});
+  const cursor = (await c.json()).cursor;
+
+  // el navegador revalida con If-None-Match; si nada cambió no se redibuja
+  const r = await fetch(`${API_BASE}/facturas`, {cache:"no-cache"});
+  const etag = r.headers.get("ETag");
+  cursorCambios = cursor;
+  if(etag && etag===etagFacturas) return;
+  etagFacturas = etag;
   const data = await r.json();
 
   tbody.innerHTML = "";
-  let total=0, pend=0, venc=0, porv=0;
-  const hoy = new Date().toISOString().slice(0,10);
-
   data.forEach(f=>{
-    total += Number(f.monto||0);
-    if((f.estado||"pendiente")==="pendiente"){
-      pend++;
-      if(f.vence<hoy) venc++; else porv++;
-    }
     const tr = document.createElement("tr");
-    tr.innerHTML = `
+    tr.dataset.id = f.id;
+    tr.innerHTML = filaHtml(f);
+    tbody.appendChild(tr);
+  });
+}
+
+// trae solo lo que cambió desde el último cursor y parcha la tabla
+async function sincronizar(){
+  if(cursorCambios===null) return cargar();
+  let mas = true;
+  while(mas){
+    const r = await fetch(`${API_BASE}/facturas/changes?since=${encodeURIComponent(cursorCambios)}`, {cache:"no-cache"});
+    if(r.status===410){ etagFacturas = null; return cargar(); }
+    const j = await r.json();
+    j.upserts.forEach(f=>{
+      let tr = tbody.querySelector(`tr[data-id="${f.id}"]`);
+      if(!tr){
+        tr = document.createElement("tr");
+        tr.dataset.id = f.id;
+        tbody.appendChild(tr);
+      }
+      tr.innerHTML = filaHtml(f);
+    });
+    j.deletes.forEach(id=>{
+      tbody.querySelector(`tr[data-id="${id}"]`)?.remove();
+    });
+    cursorCambios = j.cursor;
+    mas = j.mas;
+  }
+  await cargarResumen();
+}
+
+// tarjetas del tablero: contadores calculados en el servidor (con ETag), sin recorrer la tabla
+async function cargarResumen(){
+  const r = await fetch(`${API_BASE}/facturas/resumen`, {cache:"no-cache"});
+  const j = await r.json();
+  pintarResumen(j.resumen);
+}
+
+function filaHtml(f){
+  return `
       <td>${f.id}</td>
       <td>${f.cliente}</td>
       <td>${crc(f.monto)}</td>
@@ -39,27 +84,36 @@ async function cargar(){
           ? `<button class="btn" data-pagar="${f.id}">Marcar pagada</button>`
           : `<span class="ok">Pagada</span>`}
       </td>`;
-    tbody.appendChild(tr);
-  });
+}
 
-  $("#r-total").textContent = crc(total);
-  $("#r-pend").textContent = pend;
-  $("#r-venc").textContent = venc;
-  $("#r-porv").textContent = porv;
+function pintarResumen(r){
+  $("#r-total").textContent = crc(r.monto_total);
+  $("#r-pend").textContent = r.pendientes;
+  $("#r-venc").textContent = r.vencidas;
+  $("#r-porv").textContent = r.por_vencer;
+}
 
-  tbody.querySelectorAll("[data-pagar]").forEach(btn=>{
-    btn.addEventListener("click", async ()=>{
-      const id = btn.getAttribute("data-pagar");
-      await fetch(`${API_BASE}/facturas/${id}`, {
-        method:"PUT",
-        headers:{"Content-Type":"application/json"},
-        body: JSON.stringify({estado:"pagada"})
-      });
-      await cargar();
-    });
+// PATCH /facturas devuelve solo las filas que cambiaron y los contadores nuevos
+async function marcarPagadas(ids){
+  const r = await fetch(`${API_BASE}/facturas`, {
+    method:"PATCH",
+    headers:{"Content-Type":"application/json"},
+    body: JSON.stringify({ids, cambios:{estado:"pagada"}})
+  });
+  const j = await r.json();
+  if(!j.ok) return;
+  j.facturas.forEach(f=>{
+    const tr = tbody.querySelector(`tr[data-id="${f.id}"]`);
+    if(tr) tr.innerHTML = filaHtml(f);
   });
+  pintarResumen(j.resumen);
 }
 
+tbody.addEventListener("click", (ev)=>{
+  const btn = ev.target.closest("[data-pagar]");
+  if(btn) marcarPagadas([Number(btn.getAttribute("data-pagar"))]);
+});
+
 async function crear(e){
   e.preventDefault();
   const f = e.target;
@@ -74,11 +128,12 @@ async function crear(e){
     body: JSON.stringify(payload)
   });
   f.reset();
-  await cargar();
+  await sincronizar();
 }
 
 window.addEventListener("DOMContentLoaded", async ()=>{
   await ping();
-  await cargar();
+  await Promise.all([cargarResumen(), cargar()]);
   $("#form-factura").addEventListener("submit", crear);
+  setInterval(sincronizar, 30000);
 });
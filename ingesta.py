@@ -0,0 +1,301 @@
+import io
+import csv
+import time
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+# ---------------------------
+# Ingesta masiva de facturas
+# ---------------------------
+# Filas por sentencia INSERT (executemany / VALUES multi-fila).
+BATCH_SIZE = 5000
+
+COLUMNAS = ["cliente", "monto", "vence", "estado", "telefono", "numero", "huella"]
+# columnas que, si cambian en una re-carga, cuentan como 'actualizada'
+COLUMNAS_DATOS = ["cliente", "monto", "vence", "telefono", "numero"]
+# límite de parámetros por IN (...) al buscar huellas existentes
+LOOKUP_SIZE = 500
+
+
+def definir_cargas(metadata):
+    """Hash de cada archivo ya cargado, para saltar re-cargas idénticas."""
+    return sa.Table(
+        "cargas", metadata,
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("nombre", sa.String(255), nullable=True),
+        sa.Column("filas", sa.Integer, nullable=False),
+        sa.Column("creado", sa.DateTime, nullable=False),
+    )
+
+
+def hash_archivo(stream, bloque: int = 1 << 20) -> str:
+    """sha256 del archivo leyendo por bloques; deja el stream al inicio."""
+    h = hashlib.sha256()
+    stream.seek(0)
+    for parte in iter(lambda: stream.read(bloque), b""):
+        h.update(parte)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+def carga_previa(conn, cargas, digest: str):
+    return conn.execute(sa.select(cargas).where(cargas.c.hash == digest)).first()
+
+
+def registrar_carga(conn, cargas, digest: str, nombre: str, filas: int) -> None:
+    if carga_previa(conn, cargas, digest) is None:
+        conn.execute(cargas.insert().values(hash=digest, nombre=nombre, filas=filas, creado=datetime.utcnow()))
+
+
+def huellas(df: pd.DataFrame) -> pd.Series:
+    """
+    Clave natural de cada factura: el número de factura si viene, si no
+    cliente (sin mayúsculas ni espacios dobles) + monto + vence.
+    """
+    if df.empty:
+        # con pandas 3 las columnas vacías son de tipo str y "c|" + ... falla
+        return pd.Series([], index=df.index, dtype=object)
+    cliente = df["cliente"].astype(str).str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+    monto = df["monto"].astype(float).round(2).map("{:.2f}".format)
+    vence = pd.to_datetime(df["vence"]).dt.strftime("%Y-%m-%d")
+    clave = "c|" + cliente + "|" + monto + "|" + vence
+    if "numero" in df.columns:
+        numero = df["numero"].astype(object).where(df["numero"].notna(), None)
+        con_numero = numero.notna()
+        clave = clave.where(~con_numero, "n|" + numero[con_numero].astype(str).str.strip())
+    return clave.map(lambda s: hashlib.sha1(s.encode("utf-8")).hexdigest())
+
+
+def estados_por_fecha(vence: pd.Series, hoy=None) -> np.ndarray:
+    """'vencida' si vence antes de hoy, 'pendiente' si no, para toda la columna."""
+    hoy = hoy or datetime.utcnow().date()
+    fechas = pd.to_datetime(vence, errors="coerce")
+    return np.where(fechas < pd.Timestamp(hoy), "vencida", "pendiente")
+
+
+def preparar_lote(df: pd.DataFrame, hoy=None) -> pd.DataFrame:
+    """Deja el DataFrame con las columnas de 'facturas' listas para escribir."""
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS)
+    out = pd.DataFrame({
+        "cliente": df["cliente"].astype(str),
+        "monto": df["monto"].astype(float),
+        "vence": df["vence"],
+    })
+    out["estado"] = estados_por_fecha(out["vence"], hoy)
+    for col in ("telefono", "numero"):
+        if col in df.columns:
+            out[col] = df[col].astype(object).where(df[col].notna(), None)
+        else:
+            out[col] = None
+    out["huella"] = huellas(out)
+    return out[COLUMNAS]
+
+
+def _registros(df: pd.DataFrame):
+    # to_dict convierte NaN/None de forma uniforme y devuelve tipos nativos
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _copy_postgres(conn, tabla, df: pd.DataFrame) -> None:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in df.itertuples(index=False, name=None):
+        writer.writerow(["" if v is None or (isinstance(v, float) and np.isnan(v)) else v for v in row])
+    buf.seek(0)
+
+    cols = ", ".join(COLUMNAS)
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(f"COPY {tabla.name} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cur.close()
+
+
+def _usa_copy(conn) -> bool:
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+
+def insertar_lote(conn, tabla, df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Escribe un DataFrame ya preparado en 'tabla' dentro de la transacción de 'conn'.
+    - Postgres (psycopg2): COPY FROM STDIN, un único viaje por lote.
+    - Resto: executemany en lotes de 'batch_size' filas.
+    """
+    if df.empty:
+        return 0
+
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size]
+        if _usa_copy(conn):
+            _copy_postgres(conn, tabla, chunk)
+        else:
+            conn.execute(tabla.insert(), _registros(chunk))
+    return len(df)
+
+
+def _existentes(conn, tabla, claves) -> pd.DataFrame:
+    c = tabla.c
+    cols = [c.id, c.estado] + [c[k] for k in COLUMNAS_DATOS] + [c.huella]
+    partes = []
+    for i in range(0, len(claves), LOOKUP_SIZE):
+        rows = conn.execute(sa.select(*cols).where(c.huella.in_(claves[i:i + LOOKUP_SIZE]))).all()
+        if rows:
+            partes.append(pd.DataFrame(rows, columns=[col.name for col in cols]))
+    if not partes:
+        return pd.DataFrame(columns=[col.name for col in cols])
+    return pd.concat(partes, ignore_index=True)
+
+
+def _iguales(a: pd.Series, b: pd.Series) -> pd.Series:
+    a, b = a.astype(object), b.astype(object)
+    return (a == b) | (a.isna() & b.isna())
+
+
+def upsert_lote(conn, tabla, df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Upsert por huella: inserta lo nuevo en lote, actualiza solo las filas cuyo
+    contenido cambió y cuenta el resto como sin cambios. Si el archivo repite
+    una factura, vale la última aparición.
+    """
+    cuenta = {"insertados": 0, "actualizados": 0, "sin_cambios": 0, "repetidos": 0}
+    if df.empty:
+        return cuenta
+    unicos = df.drop_duplicates("huella", keep="last")
+    cuenta["repetidos"] = len(df) - len(unicos)
+
+    for start in range(0, len(unicos), batch_size):
+        lote = unicos.iloc[start:start + batch_size]
+        previos = _existentes(conn, tabla, lote["huella"].tolist())
+        m = lote.merge(previos, on="huella", how="left", suffixes=("", "_db"))
+        existe = m["id"].notna()
+
+        nuevos = m.loc[~existe, COLUMNAS]
+        cuenta["insertados"] += insertar_lote(conn, tabla, nuevos, batch_size)
+
+        viejos = m[existe]
+        if viejos.empty:
+            continue
+        iguales = np.logical_and.reduce([
+            _iguales(viejos[k].round(2) if k == "monto" else viejos[k],
+                     viejos[f"{k}_db"].astype(float).round(2) if k == "monto" else viejos[f"{k}_db"])
+            for k in COLUMNAS_DATOS
+        ])
+        cambiados = viejos[~iguales]
+        cuenta["sin_cambios"] += int(iguales.sum())
+        if cambiados.empty:
+            continue
+
+        # el estado solo se recalcula si cambió la fecha y no fue cerrada a mano
+        abierta = cambiados["estado_db"].isin(["pendiente", "vencida"])
+        vence_cambio = ~_iguales(cambiados["vence"], cambiados["vence_db"])
+        estado = cambiados["estado"].where(abierta & vence_cambio, cambiados["estado_db"])
+
+        upd = cambiados[COLUMNAS_DATOS].assign(estado=estado.values, b_id=cambiados["id"].astype(int).values)
+        conn.execute(tabla.update().where(tabla.c.id == sa.bindparam("b_id")), _registros(upd))
+        cuenta["actualizados"] += len(upd)
+
+    return cuenta
+
+
+def cargar_dataframe(engine, tabla, df: pd.DataFrame, batch_size: int = BATCH_SIZE, registrar=None) -> dict:
+    """
+    Calcula estado, inserta en lote y devuelve métricas de la carga.
+    'registrar(conn, cuenta)' corre en la misma transacción que la escritura.
+    """
+    t0 = time.perf_counter()
+    lote = preparar_lote(df)
+    with engine.begin() as conn:
+        cuenta = upsert_lote(conn, tabla, lote, batch_size)
+        if registrar:
+            registrar(conn, cuenta)
+    segundos = time.perf_counter() - t0
+    return {
+        **cuenta,
+        "segundos": round(segundos, 3),
+        "filas_por_seg": int(len(lote) / segundos) if segundos > 0 else len(lote),
+    }
+
+
+class BloqueIlegible(Exception):
+    """
+    Lo que entrega un lector por bloques en lugar del DataFrame cuando no pudo
+    leer ese bloque (p. ej. una línea mal formada): el error queda en ese
+    bloque y la lectura sigue con el siguiente.
+    """
+
+    def __init__(self, mensaje: str, filas: int = 0):
+        super().__init__(mensaje)
+        self.filas = filas
+
+
+def cargar_bloques(engine, tabla, bloques, normalizar, batch_size: int = BATCH_SIZE,
+                   hechos=(), registrar=None) -> dict:
+    """
+    Carga un archivo por bloques: cada bloque se normaliza y se escribe en su
+    propia transacción, así la memoria queda acotada al tamaño del bloque.
+    Los errores se informan por bloque en lugar de abortar toda la carga,
+    también los de lectura si el lector entrega un BloqueIlegible.
+
+    Para reanudar: los bloques en 'hechos' se saltan, y 'registrar(conn, info)'
+    se llama dentro de la misma transacción que escribió el bloque (o en una
+    aparte si falló), así el avance guardado nunca queda desfasado de los datos.
+    """
+    t0 = time.perf_counter()
+    totales = {"insertados": 0, "actualizados": 0, "sin_cambios": 0, "repetidos": 0}
+    filas, detalle, errores, telefonos_invalidos = 0, [], 0, 0
+    hechos = set(hechos)
+
+    for n, crudo in enumerate(bloques, start=1):
+        leidas = crudo.filas if isinstance(crudo, BloqueIlegible) else len(crudo)
+        filas += leidas
+        if n in hechos:
+            continue
+        info = {"bloque": n, "filas": leidas}
+        t_bloque = time.perf_counter()
+        try:
+            if isinstance(crudo, BloqueIlegible):
+                raise crudo
+            df = normalizar(crudo)
+            descartadas = crudo.index.difference(df.index)
+            info["descartadas"] = len(descartadas)
+            if len(descartadas):
+                # número de línea en el archivo (1 = encabezado)
+                info["lineas_invalidas"] = [int(i) + 2 for i in descartadas[:20]]
+            malos = df.attrs.get("telefonos_invalidos", [])
+            info["telefonos_invalidos"] = len(malos)
+            if malos:
+                info["lineas_telefono_invalido"] = [int(i) + 2 for i in malos[:20]]
+            with engine.begin() as conn:
+                info.update(upsert_lote(conn, tabla, preparar_lote(df), batch_size))
+                info["segundos"] = round(time.perf_counter() - t_bloque, 3)
+                if registrar:
+                    registrar(conn, info)
+            for k in totales:
+                totales[k] += info[k]
+            telefonos_invalidos += info["telefonos_invalidos"]
+        except Exception as e:
+            info["insertados"] = 0
+            info["error"] = str(e)
+            info["segundos"] = round(time.perf_counter() - t_bloque, 3)
+            errores += 1
+            if registrar:
+                with engine.begin() as conn:
+                    registrar(conn, info)
+        detalle.append(info)
+
+    segundos = time.perf_counter() - t0
+    procesadas = sum(totales.values())
+    return {
+        **totales,
+        "filas": filas,
+        "errores": errores,
+        "telefonos_invalidos": telefonos_invalidos,
+        "bloques": detalle,
+        "segundos": round(segundos, 3),
+        "filas_por_seg": int(procesadas / segundos) if segundos > 0 else procesadas,
+    }
@@ -0,0 +1,214 @@
+"""
+Métricas en proceso con salida en formato de texto de Prometheus.
+
+- latencia por ruta (hooks de Flask)
+- latencia por consulta y filas por escritura (eventos de SQLAlchemy)
+- latencia y códigos de respuesta de Wasender (envios.py; se registran en
+  worker.py, que las sirve en su propio puerto con servir())
+- perfil por muestreo opcional por request (header X-Profile: 1)
+
+Cada worker de gunicorn tiene su propio registro; Prometheus debe
+raspar cada proceso o usarse con un solo worker.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FILAS_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+def _labels_txt(labels) -> str:
+    if not labels:
+        return ""
+    partes = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+class Counter:
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre, self.ayuda = nombre, ayuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._valores[key] = self._valores.get(key, 0) + valor
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for key, v in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_labels_txt(key)} {v}")
+        return lineas
+
+
+class Histogram:
+    def __init__(self, nombre: str, ayuda: str, buckets=DEFAULT_BUCKETS):
+        self.nombre, self.ayuda = nombre, ayuda
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if valor <= b:
+                    s[0][i] += 1
+            s[1] += valor
+            s[2] += 1
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for key, (conteos, suma, total) in sorted(self._series.items()):
+                for b, n in zip(self.buckets, conteos):
+                    lineas.append(f"{self.nombre}_bucket{_labels_txt(key + (('le', b),))} {n}")
+                lineas.append(f"{self.nombre}_bucket{_labels_txt(key + (('le', '+Inf'),))} {total}")
+                lineas.append(f"{self.nombre}_sum{_labels_txt(key)} {suma}")
+                lineas.append(f"{self.nombre}_count{_labels_txt(key)} {total}")
+        return lineas
+
+
+http_latencia = Histogram("noa_http_request_seconds", "Latencia de requests por ruta")
+db_latencia = Histogram("noa_db_query_seconds", "Latencia de consultas SQL por operación")
+db_filas = Histogram("noa_db_query_rows", "Filas afectadas por INSERT/UPDATE/DELETE", FILAS_BUCKETS)
+wasender_latencia = Histogram("noa_wasender_request_seconds", "Latencia de llamadas a Wasender")
+wasender_respuestas = Counter("noa_wasender_responses_total", "Respuestas de Wasender por código")
+
+REGISTRO = [http_latencia, db_latencia, db_filas, wasender_latencia, wasender_respuestas]
+
+
+def exponer() -> str:
+    lineas = []
+    for m in REGISTRO:
+        lineas.extend(m.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        datos = exponer().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir(puerto: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """/metrics en un hilo aparte, para procesos sin Flask (worker.py)."""
+    server = ThreadingHTTPServer((host, puerto), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------------------------
+# Flask
+# ---------------------------
+def instrumentar_app(app) -> None:
+    @app.before_request
+    def _inicio():
+        g._metricas_t0 = time.perf_counter()
+        if os.getenv("PROFILING") == "1" and request.headers.get("X-Profile") == "1":
+            g._perfil = PerfilMuestreo().iniciar()
+
+    @app.after_request
+    def _fin(resp):
+        t0 = g.pop("_metricas_t0", None)
+        if t0 is not None:
+            ruta = request.url_rule.rule if request.url_rule else "404"
+            http_latencia.observe(time.perf_counter() - t0, metodo=request.method, ruta=ruta, status=resp.status_code)
+        perfil = g.pop("_perfil", None)
+        if perfil is not None:
+            resp.headers["X-Profile-File"] = perfil.detener_y_guardar(request.endpoint or "desconocido")
+        return resp
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(exponer(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------------------------
+# SQLAlchemy
+# ---------------------------
+def instrumentar_engine(engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metricas_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get("_metricas_t0")
+        if not pila:
+            return
+        op = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+        db_latencia.observe(time.perf_counter() - pila.pop(), op=op)
+        # solo escrituras: para SELECT sqlite da -1 y las filas se leen después,
+        # así que no hay un conteo que valga igual en todos los drivers
+        if op in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount is not None and cursor.rowcount >= 0:
+            db_filas.observe(cursor.rowcount, op=op)
+
+
+# ---------------------------
+# Perfil por muestreo
+# ---------------------------
+class PerfilMuestreo:
+    """
+    Muestrea la pila del hilo del request cada 'intervalo' segundos y guarda
+    las pilas en formato 'folded' (flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self, intervalo: float = None):
+        self.intervalo = intervalo or float(os.getenv("PROFILING_INTERVAL", 0.005))
+        self.muestras = _Counter()
+        self._hilo = threading.get_ident()
+        self._parar = threading.Event()
+        self._muestreador = threading.Thread(target=self._loop, daemon=True)
+
+    def iniciar(self):
+        self._muestreador.start()
+        return self
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self._hilo)
+            pila = []
+            while frame is not None:
+                code = frame.f_code
+                pila.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if pila:
+                self.muestras[";".join(reversed(pila))] += 1
+
+    def detener_y_guardar(self, nombre: str) -> str:
+        self._parar.set()
+        self._muestreador.join()
+        carpeta = os.getenv("PROFILING_DIR", "/tmp/noa-perfiles")
+        os.makedirs(carpeta, exist_ok=True)
+        path = os.path.join(carpeta, f"{nombre}-{int(time.time() * 1000)}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for pila, n in self.muestras.most_common():
+                f.write(f"{pila} {n}\n")
+        return path
@@ -0,0 +1,129 @@
+import os
+from functools import lru_cache
+from itertools import repeat
+from string import Formatter
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Plantillas de mensajes
+# ---------------------------
+DEFAULT_TEMPLATE = "Estimado {cliente}, le recordamos su factura por ₡{monto} que vence el {vence}. – {firma}"
+DEFAULTS = {
+    "proximas": DEFAULT_TEMPLATE,
+    "vencidas": "Estimado {cliente}, su factura por ₡{monto} venció el {vence}. – {firma}",
+}
+
+
+CAMPOS = ("cliente", "monto", "vence", "firma")
+
+# un solo mensaje por teléfono cuando tiene varias facturas
+RESUMEN_DEFAULTS = {
+    "proximas": "Estimado {cliente}, le recordamos sus {cantidad} facturas por un total de ₡{total}; "
+                "la primera vence el {vence}.{detalle} – {firma}",
+    "vencidas": "Estimado {cliente}, tiene {cantidad} facturas vencidas por un total de ₡{total}; "
+                "la más antigua venció el {vence}.{detalle} – {firma}",
+}
+CAMPOS_RESUMEN = ("cliente", "cantidad", "total", "vence", "detalle", "firma")
+# tope de caracteres del detalle por factura dentro del resumen
+DETALLE_MAX = int(os.getenv("NOTIF_DETALLE_MAX", 600))
+
+
+class Plantilla:
+    """
+    Plantilla str.format compilada una vez: los campos con nombre pasan a
+    posiciones y la firma queda fija, así cada mensaje es una sola llamada
+    a format() sobre columnas ya formateadas en lote.
+    """
+
+    def __init__(self, texto: str, firma: str, campos=CAMPOS):
+        self.texto = texto
+        self.firma = firma
+        self.campos = campos
+        partes = []
+        for literal, campo, spec, conv in Formatter().parse(texto):
+            partes.append(literal.replace("{", "{{").replace("}", "}}"))
+            if campo is None:
+                continue
+            if campo not in campos:
+                raise KeyError(campo)
+            if campo == "firma" and not spec and not conv:
+                partes.append(firma.replace("{", "{{").replace("}", "}}"))
+                continue
+            partes.append("{" + str(campos.index(campo)) + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "") + "}")
+        self._format = "".join(partes).format
+
+    def render_lote(self, clientes, montos, vences) -> list:
+        return list(map(
+            self._format,
+            pd.Series(clientes, dtype=object).astype(str).tolist(),
+            formatear_montos(montos),
+            formatear_fechas(vences),
+            repeat(self.firma),
+        ))
+
+    def render_formateado(self, cliente, monto: str, vence: str) -> str:
+        """Un mensaje con monto y vence ya pasados por formatear_montos/formatear_fechas."""
+        return self._format(str(cliente), monto, vence, self.firma)
+
+    def render_resumen(self, cliente, textos_monto, textos_vence, total: str, detalle: bool = True) -> str:
+        """
+        Un mensaje para varias facturas (ordenadas por vence) de un mismo
+        teléfono. Montos, fechas y total llegan ya formateados: quien agrupa
+        los formatea una vez para todos los teléfonos.
+        """
+        lineas = ""
+        if detalle:
+            for i, (m, v) in enumerate(zip(textos_monto, textos_vence)):
+                linea = f"\n• ₡{m} – {v}"
+                if len(lineas) + len(linea) > DETALLE_MAX:
+                    lineas += f"\n… y {len(textos_monto) - i} más"
+                    break
+                lineas += linea
+            lineas += "\n" if lineas else ""
+        return self._format(str(cliente), len(textos_monto), total, textos_vence[0], lineas, self.firma)
+
+
+def formatear_montos(montos) -> np.ndarray:
+    """1234567.4 -> '1.234.567' para toda la columna."""
+    s = pd.Series(montos, dtype=float).map("{:,.0f}".format).str.replace(",", ".", regex=False)
+    return s.to_numpy(dtype=object)
+
+
+def formatear_fechas(vences) -> np.ndarray:
+    """Formatea cada fecha distinta una sola vez (en un lote se repiten mucho)."""
+    codigos, unicas = pd.factorize(pd.Series(vences, dtype=object))
+    textos = pd.to_datetime(pd.Series(unicas, dtype=object)).dt.strftime("%d/%m/%Y").to_numpy(dtype=object)
+    return textos[codigos]
+
+
+@lru_cache(maxsize=32)
+def compilar(texto: str, firma: str, campos=CAMPOS) -> Plantilla:
+    return Plantilla(texto, firma, campos)
+
+
+def plantilla_para(modo: str = "proximas") -> Plantilla:
+    """
+    Plantilla según 'modo': WASENDER_MSG_TEMPLATE_<MODO>, luego
+    WASENDER_MSG_TEMPLATE, luego el texto por defecto del modo. Como se
+    compila por contenido, un cambio de configuración se recoge solo.
+    """
+    modo = modo if modo in DEFAULTS else "proximas"
+    texto = (
+        os.getenv(f"WASENDER_MSG_TEMPLATE_{modo.upper()}")
+        or os.getenv("WASENDER_MSG_TEMPLATE")
+        or DEFAULTS[modo]
+    )
+    return compilar(texto, os.getenv("PLANTILLA_FIRMA", "Noa Cobros"))
+
+
+def resumen_para(modo: str = "proximas") -> Plantilla:
+    """Igual que plantilla_para() pero para el resumen por teléfono (WASENDER_MSG_RESUMEN[_<MODO>])."""
+    modo = modo if modo in RESUMEN_DEFAULTS else "proximas"
+    texto = (
+        os.getenv(f"WASENDER_MSG_RESUMEN_{modo.upper()}")
+        or os.getenv("WASENDER_MSG_RESUMEN")
+        or RESUMEN_DEFAULTS[modo]
+    )
+    return compilar(texto, os.getenv("PLANTILLA_FIRMA", "Noa Cobros"), CAMPOS_RESUMEN)
@@ -4,6 +4,12 @@ import sqlalchemy as sa
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///facturas.db")
 engine = sa.create_engine(DATABASE_URL, future=True)
 
+# junto con 'facturas' van los hashes de archivos ya cargados ('cargas', si no
+# re-subir el mismo archivo se saltaría como duplicado sin filas), la versión de
+# datos ('meta') y las subidas en curso, que apuntan a esas cargas
+TABLAS = ["subidas_bloques", "subidas", "cargas", "meta", "facturas"]
+
 with engine.begin() as conn:
-    conn.exec_driver_sql("DROP TABLE IF EXISTS facturas;")
-print("Tabla 'facturas' eliminada. Se recreará al iniciar app.py")
+    for tabla in TABLAS:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {tabla};")
+print(f"Tablas {', '.join(TABLAS)} eliminadas. Se recrearán al iniciar app.py")
@@ -0,0 +1,187 @@
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+# ---------------------------
+# Cargas asíncronas (/upload-file?async=1)
+# ---------------------------
+# estados: pendiente -> procesando -> completa | con_errores | fallida
+# Cada bloque terminado queda en 'subidas_bloques' en la misma transacción que
+# escribió sus filas; al reanudar solo se reprocesan los bloques sin 'ok'.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/tmp/noa-uploads")
+WORKERS = int(os.getenv("UPLOAD_WORKERS", 1))
+# un job 'procesando' sin avance en este tiempo se considera abandonado
+LEASE = timedelta(minutes=10)
+
+CONTADORES = ["insertados", "actualizados", "sin_cambios", "repetidos", "descartadas", "telefonos_invalidos"]
+
+
+def definir_tablas(metadata):
+    subidas = sa.Table(
+        "subidas", metadata,
+        sa.Column("job_id", sa.String(32), primary_key=True),
+        sa.Column("nombre", sa.String(255), nullable=True),
+        sa.Column("hash", sa.String(64), nullable=False),
+        sa.Column("ruta", sa.String(512), nullable=False),
+        sa.Column("estado", sa.String(16), nullable=False),
+        sa.Column("filas", sa.Integer, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("creado", sa.DateTime, nullable=False),
+        sa.Column("actualizado", sa.DateTime, nullable=False),
+    )
+    bloques = sa.Table(
+        "subidas_bloques", metadata,
+        sa.Column("job_id", sa.String(32), primary_key=True),
+        sa.Column("bloque", sa.Integer, primary_key=True),
+        sa.Column("estado", sa.String(16), nullable=False),
+        sa.Column("filas", sa.Integer, nullable=False),
+        *[sa.Column(k, sa.Integer, nullable=False, default=0) for k in CONTADORES],
+        sa.Column("lineas_invalidas", sa.Text, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("segundos", sa.Float, nullable=False, default=0),
+    )
+    return subidas, bloques
+
+
+def guardar(file_storage) -> tuple:
+    """Guarda el archivo subido en UPLOAD_DIR y devuelve (job_id, ruta)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    ext = os.path.splitext(file_storage.filename or "")[1].lower()
+    ruta = os.path.join(UPLOAD_DIR, job_id + ext)
+    file_storage.stream.seek(0)
+    file_storage.save(ruta)
+    return job_id, ruta
+
+
+def crear(conn, tablas, job_id: str, nombre: str, digest: str, ruta: str) -> None:
+    subidas, _ = tablas
+    ahora = datetime.utcnow()
+    conn.execute(subidas.insert().values(
+        job_id=job_id, nombre=nombre, hash=digest, ruta=ruta, estado="pendiente", creado=ahora, actualizado=ahora,
+    ))
+
+
+def _registrador(tablas, job_id: str):
+    subidas, bloques = tablas
+
+    def registrar(conn, info):
+        fila = {k: int(info.get(k, 0)) for k in CONTADORES}
+        lineas = info.get("lineas_invalidas")
+        conn.execute(bloques.delete().where(bloques.c.job_id == job_id, bloques.c.bloque == info["bloque"]))
+        conn.execute(bloques.insert().values(
+            job_id=job_id, bloque=info["bloque"], estado="error" if "error" in info else "ok",
+            filas=info["filas"], lineas_invalidas=",".join(map(str, lineas)) if lineas else None,
+            error=info.get("error"), segundos=info.get("segundos", 0), **fila,
+        ))
+        conn.execute(subidas.update().where(subidas.c.job_id == job_id).values(actualizado=datetime.utcnow()))
+
+    return registrar
+
+
+def ejecutar(engine, tablas, job_id: str, cargar) -> None:
+    """
+    Corre (o reanuda) un job. 'cargar(job, hechos, registrar)' lee job.ruta
+    por bloques y devuelve el resultado de ingesta.cargar_bloques.
+    """
+    subidas, bloques = tablas
+    with engine.begin() as conn:
+        job = conn.execute(sa.select(subidas).where(subidas.c.job_id == job_id)).first()
+        hechos = conn.execute(
+            sa.select(bloques.c.bloque).where(bloques.c.job_id == job_id, bloques.c.estado == "ok")
+        ).scalars().all()
+        conn.execute(subidas.update().where(subidas.c.job_id == job_id)
+                     .values(estado="procesando", error=None, actualizado=datetime.utcnow()))
+
+    try:
+        res = cargar(job, hechos, _registrador(tablas, job_id))
+        valores = {"estado": "con_errores" if res["errores"] else "completa", "filas": res["filas"]}
+    except Exception as e:
+        # error antes de leer bloques (encabezados, formato): no hay nada que reanudar por bloque
+        valores = {"estado": "fallida", "error": str(e)}
+
+    with engine.begin() as conn:
+        conn.execute(subidas.update().where(subidas.c.job_id == job_id)
+                     .values(**valores, actualizado=datetime.utcnow()))
+    if valores["estado"] == "completa" and os.path.exists(job.ruta):
+        os.remove(job.ruta)
+
+
+_pool = None
+_activos = set()
+_lock = threading.Lock()
+
+
+def lanzar(engine, tablas, job_id: str, cargar) -> bool:
+    """Encola el job en el pool del proceso; False si ya está corriendo aquí."""
+    global _pool
+    with _lock:
+        if job_id in _activos:
+            return False
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix="subidas")
+        _activos.add(job_id)
+
+    def correr():
+        try:
+            ejecutar(engine, tablas, job_id, cargar)
+        finally:
+            with _lock:
+                _activos.discard(job_id)
+
+    _pool.submit(correr)
+    return True
+
+
+def reanudable(job) -> bool:
+    if job.estado in ("con_errores", "fallida"):
+        return True
+    # procesando/pendiente huérfano (proceso reiniciado a mitad de la carga)
+    return job.job_id not in _activos and job.actualizado < datetime.utcnow() - LEASE
+
+
+def obtener(engine, tablas, job_id: str):
+    subidas, _ = tablas
+    with engine.begin() as conn:
+        return conn.execute(sa.select(subidas).where(subidas.c.job_id == job_id)).first()
+
+
+def progreso(engine, tablas, job_id: str):
+    """Avance de un job: totales, filas/seg y detalle por bloque; None si no existe."""
+    subidas, bloques = tablas
+    with engine.begin() as conn:
+        job = conn.execute(sa.select(subidas).where(subidas.c.job_id == job_id)).first()
+        if job is None:
+            return None
+        detalle = conn.execute(
+            sa.select(bloques).where(bloques.c.job_id == job_id).order_by(bloques.c.bloque)
+        ).all()
+
+    totales = {k: sum(b._mapping[k] for b in detalle) for k in CONTADORES}
+    ok = [b for b in detalle if b.estado == "ok"]
+    procesadas = sum(b.filas for b in ok)
+    segundos = sum(b.segundos for b in detalle)
+    return {
+        "job_id": job.job_id,
+        "nombre": job.nombre,
+        "estado": job.estado,
+        "terminado": job.estado in ("completa", "con_errores", "fallida"),
+        "filas": job.filas,
+        "procesadas": procesadas,
+        **totales,
+        "bloques_ok": len(ok),
+        "errores": len(detalle) - len(ok),
+        "segundos": round(segundos, 3),
+        "filas_por_seg": int(procesadas / segundos) if segundos > 0 else 0,
+        "error": job.error,
+        "bloques": [
+            {k: v for k, v in b._mapping.items() if k != "job_id" and v is not None}
+            for b in detalle if b.estado == "error" or len(detalle) <= 100
+        ],
+        "creado": job.creado.isoformat(),
+        "actualizado": job.actualizado.isoformat(),
+    }
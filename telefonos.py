@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------
+# Normalización de teléfonos (E.164)
+# ---------------------------
+# '8888-8888', '506 8888 8888', '+50688888888' y 88888888.0 (Excel) -> '+50688888888'.
+PAIS = os.getenv("TELEFONO_PAIS", "506")
+# largo del número nacional del país por defecto (Costa Rica: 8 dígitos)
+LARGO_NACIONAL = int(os.getenv("TELEFONO_LARGO_NACIONAL", 8))
+# primer dígito válido de un número nacional (CR: 2 fijo, 4 VoIP, 5-8 móvil/servicios)
+INICIOS_VALIDOS = os.getenv("TELEFONO_INICIOS", "245678")
+
+# valores ya resueltos entre cargas; los reportes repiten los mismos números día a día
+MEMO_MAX = 200_000
+_memo = {}
+
+
+def _resolver_unicos(textos: pd.Series, pais: str) -> pd.Series:
+    """E.164 (o None si no es válido) para una serie de strings únicos."""
+    s = textos.str.strip().str.replace(r"\.0$", "", regex=True)
+    internacional = s.str.startswith("+") | s.str.startswith("00")
+    digitos = s.str.replace(r"\D", "", regex=True)
+    digitos = digitos.where(~s.str.startswith("00"), digitos.str[2:])
+    largo = digitos.str.len()
+
+    nacional = ~internacional & (largo == LARGO_NACIONAL)
+    con_pais = ~internacional & (largo == len(pais) + LARGO_NACIONAL) & digitos.str.startswith(pais)
+    completo = pd.Series(np.select(
+        [nacional, con_pais | internacional],
+        [pais + digitos, digitos],
+        "",
+    ), index=textos.index, dtype=object)
+
+    # del país por defecto se valida el largo y el primer dígito; del resto, solo el rango E.164
+    del_pais = completo.str.startswith(pais)
+    resto = completo.str[len(pais):]
+    ok_pais = (resto.str.len() == LARGO_NACIONAL) & resto.str[:1].isin(list(INICIOS_VALIDOS))
+    ok_otro = completo.str.len().between(8, 15) & ~completo.str.startswith("0")
+    valido = np.where(del_pais, ok_pais, ok_otro) & (completo != "")
+    return ("+" + completo).where(valido, None)
+
+
+def a_e164(serie: pd.Series, pais: str = None) -> tuple:
+    """
+    Normaliza una columna completa. Devuelve (telefonos, invalidos): la serie
+    en E.164 (None si falta o no es válido) y una máscara de los valores que
+    venían escritos pero no se pudieron normalizar. Cada valor distinto se
+    resuelve una sola vez y los ya vistos salen del memo.
+    """
+    pais = pais or PAIS
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    textos = pd.Series(unicos, dtype=object).astype(str)
+    vacios = textos.str.strip().isin(["", "nan", "None"])
+
+    claves = list(zip(textos, [pais] * len(textos)))
+    resueltos = pd.Series([_memo.get(k, False) for k in claves], index=textos.index, dtype=object)
+    nuevos = (resueltos.map(lambda v: v is False)) & ~vacios
+    if nuevos.any():
+        resueltos[nuevos] = _resolver_unicos(textos[nuevos], pais)
+        if len(_memo) > MEMO_MAX:
+            _memo.clear()
+        _memo.update((claves[i], resueltos[i]) for i in np.flatnonzero(nuevos.to_numpy()))
+    validos = resueltos.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+
+    # el centinela -1 (NaN/None) apunta a un None agregado al final
+    tabla = np.append(np.where(validos, resueltos.to_numpy(dtype=object), None), None)
+    malos = np.append(~validos & ~vacios.to_numpy(), False)
+    return (
+        pd.Series(tabla[codigos], index=serie.index, dtype=object),
+        pd.Series(malos[codigos], index=serie.index, dtype=bool),
+    )
+
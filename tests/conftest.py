@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="noa-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/facturas.db"
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+# bloques chicos para que los archivos de prueba tengan varios
+os.environ["UPLOAD_CHUNK_SIZE"] = "2"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as noa  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with noa.engine.begin() as conn:
+        for t in (noa.facturas, noa.notificaciones, noa.cargas, *noa.tablas_subidas):
+            conn.execute(t.delete())
+    return noa.app.test_client()
+
+
+@pytest.fixture
+def subir(client):
+    """Sube un CSV (texto) por /upload-file y devuelve el JSON de la respuesta."""
+    import io
+
+    def _subir(csv: str, nombre: str = "facturas.csv", query: str = ""):
+        r = client.post("/upload-file" + query, data={"file": (io.BytesIO(csv.encode("utf-8")), nombre)})
+        return r.get_json()
+    return _subir
@@ -0,0 +1,51 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+CSV = (
+    "cliente,monto,vence,numero\n"
+    "José Pérez,10,2026-01-10,F1\n"
+    "JOSE PEREZ SRL,20,2026-02-10,F2\n"
+    "Ana Núñez,30,2026-03-10,F3\n"
+    "Pe%rez_,40,2026-04-10,F4\n"
+)
+
+
+@pytest.fixture
+def cargadas(subir):
+    assert subir(CSV)["insertados"] == 4
+
+
+def _clientes(client, query):
+    r = client.get("/facturas?" + query)
+    assert r.status_code == 200
+    return [f["cliente"] for f in r.get_json()["data"]]
+
+
+def test_sin_acentos_ni_mayusculas(client, cargadas):
+    assert _clientes(client, "q=perez") == ["José Pérez", "JOSE PEREZ SRL"]
+    assert _clientes(client, "q=PÉREZ") == ["José Pérez", "JOSE PEREZ SRL"]
+    assert _clientes(client, "q=nunez") == ["Ana Núñez"]
+
+
+def test_comodines_literales(client, cargadas):
+    assert _clientes(client, "q=e%25r") == ["Pe%rez_"]
+    assert _clientes(client, "q=z_") == ["Pe%rez_"]
+
+
+def test_relevancia_en_sqlite_pagina_por_keyset(client, cargadas):
+    r = client.get("/facturas?q=perez&orden=relevancia&limit=1").get_json()
+    assert [f["cliente"] for f in r["data"]] == ["José Pérez"]
+    r = client.get(f"/facturas?q=perez&orden=relevancia&limit=1&after={r['next']}").get_json()
+    assert [f["cliente"] for f in r["data"]] == ["JOSE PEREZ SRL"]
+
+
+def test_sql_postgres(monkeypatch):
+    import app as noa
+
+    monkeypatch.setattr(noa, "BUSQUEDA_PG", True)
+    condicion, rank = noa._busqueda_cliente("Pérez")
+    q = sa.select(noa.facturas.c.id).where(condicion).order_by(rank.desc())
+    sql = str(q.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert "f_unaccent(lower(facturas.cliente)) LIKE '%%perez%%' ESCAPE" in sql
+    assert "similarity(f_unaccent(lower(facturas.cliente)), 'perez') DESC" in sql
@@ -0,0 +1,17 @@
+from cache_http import LRU
+
+
+def test_lru_respeta_el_tope_de_bytes():
+    lru = LRU(max_entradas=100, max_bytes=1000)
+    for i in range(10):
+        lru.put(i, b"x" * 300, 300)
+    assert lru.bytes <= 1000
+    assert lru.get(9) is not None
+    assert lru.get(0) is None
+
+    lru.put(9, b"y" * 100, 100)  # reemplazar descuenta el tamaño anterior
+    assert lru.bytes == 2 * 300 + 100
+
+    lru.put("grande", b"z" * 2000, 2000)  # más que el tope: no se guarda
+    assert lru.get("grande") is None
+    assert lru.bytes == 700
@@ -0,0 +1,83 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from envios import Despachador, TokenBucket
+
+
+class _Wasender(BaseHTTPRequestHandler):
+    """Imita /send-message: responde con el teléfono recibido, con demoras al azar."""
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.conexiones.add(self.client_address)
+        time.sleep(random.uniform(0, 0.02))
+        status = 500 if cuerpo["phone"] == "falla" else 200
+        datos = json.dumps({"phone": cuerpo["phone"]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def wasender():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Wasender)
+    server.conexiones = set()
+    hilo = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    hilo.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/send-message"
+
+
+def test_lote_conserva_el_orden_y_reusa_conexiones(wasender):
+    d = Despachador(url=_url(wasender), api_key="k", workers=4, rate=0)
+    telefonos = [f"+5068000{i:04d}" for i in range(40)] + ["falla"]
+    respuestas = d.enviar_lote((t, "hola") for t in telefonos)
+    d.close()
+
+    assert [json.loads(r["resp"])["phone"] for r in respuestas] == telefonos
+    assert all(r["ok"] for r in respuestas[:-1])
+    assert respuestas[-1] == {"ok": False, "status": 500, "resp": '{"phone": "falla"}'}
+    # una conexión por hilo del pool, no una por mensaje
+    assert len(wasender.conexiones) <= 4
+
+
+def test_lote_respeta_el_limite(wasender):
+    d = Despachador(url=_url(wasender), api_key="k", workers=8, rate=50, burst=1)
+    t0 = time.perf_counter()
+    d.enviar_lote(("+50680000000", "hola") for _ in range(11))
+    d.close()
+    # la primera sale con el token inicial; las otras 10 esperan 1/50 s cada una
+    assert time.perf_counter() - t0 >= 10 / 50 * 0.9
+
+
+def test_sin_api_key_no_envia(wasender):
+    d = Despachador(url=_url(wasender), api_key="")
+    assert d.enviar("+50680000000", "hola") == {"ok": False, "error": "Falta WASENDER_API_KEY"}
+    assert not wasender.conexiones
+
+
+def test_token_bucket_rafaga_y_ritmo():
+    bucket = TokenBucket(rate=100, capacity=5)
+    t0 = time.perf_counter()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.perf_counter() - t0 < 0.02  # la ráfaga no espera
+    for _ in range(10):
+        bucket.acquire()
+    assert time.perf_counter() - t0 >= 10 / 100 * 0.9
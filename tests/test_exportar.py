@@ -0,0 +1,44 @@
+import io
+
+import pandas as pd
+import pytest
+
+import exportar
+
+CSV = "cliente,monto,vence,numero\n" + "".join(f"Cliente ñ{i % 7},{i}.5,2026-{1 + i % 12:02d}-10,F{i}\n" for i in range(25))
+
+
+@pytest.fixture
+def cargadas(subir):
+    assert subir(CSV)["insertados"] == 25
+
+
+def test_csv_content_type_y_filas(client, cargadas):
+    r = client.get("/facturas/export?format=csv&q=ñ3")
+    assert r.status_code == 200
+    assert r.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert r.headers["Content-Disposition"].startswith('attachment; filename="facturas-')
+    df = pd.read_csv(io.BytesIO(r.data), encoding="utf-8-sig")
+    assert list(df.columns) == ["id", "numero", "cliente", "monto", "vence", "estado", "telefono"]
+    assert sorted(df["id"]) == sorted(f["id"] for f in client.get("/facturas?q=ñ3").get_json()["data"])
+
+
+def test_xlsx(client, cargadas):
+    r = client.get("/facturas/export?format=xlsx")
+    assert r.headers["Content-Type"] == exportar.FORMATOS["xlsx"][0]
+    assert len(pd.read_excel(io.BytesIO(r.data))) == 25
+
+
+def test_parquet(client, cargadas):
+    if not exportar.parquet_disponible():
+        assert client.get("/facturas/export?format=parquet").status_code == 501
+        return
+    import pyarrow.parquet as pq
+
+    r = client.get("/facturas/export?format=parquet")
+    assert r.headers["Content-Type"] == exportar.FORMATOS["parquet"][0]
+    assert pq.ParquetFile(io.BytesIO(r.data)).metadata.num_rows == 25
+
+
+def test_formato_invalido(client):
+    assert client.get("/facturas/export?format=xml").status_code == 400
@@ -0,0 +1,41 @@
+import sqlalchemy as sa
+
+import metricas
+
+
+def _series(hist, op):
+    return {k: v for k, v in hist._series.items() if ("op", op) in k}
+
+
+def test_filas_por_escritura_en_sqlite():
+    engine = sa.create_engine("sqlite://")
+    metricas.instrumentar_engine(engine)
+    metricas.db_filas._series.clear()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t (x) VALUES (1), (2), (3)")
+        conn.exec_driver_sql("UPDATE t SET x = x + 1 WHERE x > 1")
+        assert len(conn.exec_driver_sql("SELECT * FROM t").all()) == 3
+
+    insert, update = _series(metricas.db_filas, "INSERT"), _series(metricas.db_filas, "UPDATE")
+    assert [s[1] for s in insert.values()] == [3.0]
+    assert [s[1] for s in update.values()] == [2.0]
+    # SELECT no tiene conteo en sqlite: queda solo en la latencia
+    assert not _series(metricas.db_filas, "SELECT")
+    assert _series(metricas.db_latencia, "SELECT")
+    assert "# HELP noa_db_query_rows Filas afectadas por INSERT/UPDATE/DELETE" in metricas.exponer()
+
+
+def test_servir_expone_wasender():
+    import urllib.request
+
+    metricas.wasender_respuestas.inc(status=200)
+    server = metricas.servir(0, host="127.0.0.1")
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(base + "/metrics") as r:
+            assert r.headers["Content-Type"] == "text/plain; version=0.0.4"
+            assert 'noa_wasender_responses_total{status="200"}' in r.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+
+def test_sin_candidatos_no_anuncia_job(client):
+    r = client.post("/notificar")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["encolados"] == 0
+    assert body["total_candidatos"] == 0
+    assert "job_id" not in body
+
+
+def test_job_encolado_tiene_progreso(client, subir):
+    vence = (date.today() + timedelta(days=1)).isoformat()
+    subir(f"cliente,monto,vence,telefono\nAna,1000,{vence},8888-8888\nLuis,2000,{vence},6000-0000\n")
+
+    r = client.post("/notificar")
+    assert r.status_code == 202
+    job = r.get_json()
+    assert job["encolados"] == 2
+
+    r = client.get(f"/notificar/{job['job_id']}")
+    assert r.status_code == 200
+    assert r.get_json()["pendientes"] == 2
@@ -0,0 +1,66 @@
+import time
+
+# la línea 5 (registro 4) tiene un campo de más
+CSV = (
+    "cliente,monto,vence\n"
+    "Ana,1,2026-01-01\n"
+    "Beto,2,2026-01-02\n"
+    "Carla,3,2026-01-03\n"
+    "Dani,4,2026-01-04,extra\n"
+    "Eva,5,2026-01-05\n"
+    'Fede,6,"2026-01-06"\n'
+    '"Gabi\nGómez",7,2026-01-07\n'
+)
+
+
+def _clientes(client):
+    return sorted(f["cliente"] for f in client.get("/facturas").get_json()["data"])
+
+
+def test_stream_linea_mal_formada_solo_falla_su_bloque(client, subir):
+    r = subir(CSV, query="?stream=1")
+    assert r["ok"] is False
+    assert r["errores"] == 1
+    assert r["filas"] == 7
+    assert r["insertados"] == 5
+    malo = [b for b in r["bloques"] if "error" in b]
+    assert [b["bloque"] for b in malo] == [2]
+    assert "Registros 3-4" in malo[0]["error"]
+    assert _clientes(client) == ["Ana", "Beto", "Eva", "Fede", "Gabi\nGómez"]
+
+
+def _esperar(client, job_id):
+    for _ in range(200):
+        info = client.get(f"/uploads/{job_id}").get_json()
+        if info["terminado"]:
+            return info
+        time.sleep(0.02)
+    raise AssertionError("el job no terminó")
+
+
+def test_async_reanudar_reintenta_solo_el_bloque_ilegible(client, subir):
+    job_id = subir(CSV, query="?async=1")["job_id"]
+    info = _esperar(client, job_id)
+    assert info["estado"] == "con_errores"
+    assert info["bloques_ok"] == 3 and info["errores"] == 1
+    assert info["insertados"] == 5
+
+    assert client.post(f"/uploads/{job_id}/reanudar").status_code == 202
+    info = _esperar(client, job_id)
+    assert info["estado"] == "con_errores"
+    assert info["insertados"] == 5  # los bloques ya cargados no se repiten
+
+
+
+# sin monto válido en ninguna fila; con UPLOAD_CHUNK_SIZE=2 el stream va en dos bloques vacíos
+INVALIDAS = "cliente,monto,vence\nAna,abc,2026-01-01\nBeto,,2026-01-02\nCarla,x,2026-01-03\n"
+
+
+def test_todas_invalidas_no_es_error(client, subir):
+    r = subir(INVALIDAS)
+    assert r["ok"] is True and r["insertados"] == 0
+
+    r = subir(INVALIDAS, query="?stream=1&forzar=1")
+    assert r["ok"] is True and r["errores"] == 0 and r["insertados"] == 0
+    assert [b["descartadas"] for b in r["bloques"]] == [2, 1]
+    assert _clientes(client) == []
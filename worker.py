@@ -0,0 +1,43 @@
+"""
+Worker de notificaciones: vacía la cola 'notificaciones' en lotes.
+
+    python worker.py            # corre en bucle
+    python worker.py --once     # vacía lo pendiente y termina
+
+Las métricas de Wasender se registran acá, no en la app: el worker las
+sirve en http://<host>:WORKER_METRICS_PORT/metrics mientras corre en
+bucle (0 lo desactiva).
+"""
+import argparse
+import os
+import time
+
+import cola
+import metricas
+from app import engine, notificaciones
+from envios import get_despachador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envía las notificaciones encoladas por /notificar")
+    parser.add_argument("--once", action="store_true", help="procesa lo pendiente y termina")
+    parser.add_argument("--batch", type=int, default=int(os.getenv("NOTIF_BATCH", 100)))
+    parser.add_argument("--poll", type=float, default=float(os.getenv("NOTIF_POLL", 5)))
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("WORKER_METRICS_PORT", 9101)))
+    args = parser.parse_args()
+
+    if args.metrics_port and not args.once:
+        metricas.servir(args.metrics_port)
+    despachador = get_despachador()
+    while True:
+        n = cola.procesar_lote(engine, notificaciones, despachador, args.batch)
+        if n:
+            print(f"procesadas {n} notificaciones", flush=True)
+            continue
+        if args.once:
+            break
+        time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    main()